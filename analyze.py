@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+from connectfourIM import Game, TranspositionTable, BOARD_MASK, has_won
+from codec import xo_from_moves, xo_from_number
+
+_table = None
+_config = None
+
+
+def parse_moves(text, first='X'):
+    x, o = xo_from_moves(text, first)
+    second = '0' if first == 'X' else 'X'
+    return x, o, first if len(text) % 2 == 0 else second
+
+
+def parse_number(text, first='X'):
+    x, o = xo_from_number(int(text))
+    xs, os = bin(x).count('1'), bin(o).count('1')
+    second = '0' if first == 'X' else 'X'
+    if xs == os:
+        turn = first
+    elif (xs if first == 'X' else os) == (os if first == 'X' else xs) + 1:
+        turn = second
+    else:
+        raise ValueError("piece counts do not match alternating play")
+    if has_won(x) or has_won(o):
+        raise ValueError("game already won")
+    return x, o, turn
+
+
+def _init(config):
+    global _table, _config
+    _config = config
+    _table = TranspositionTable(config['table_size'])
+
+
+def analyze_chunk(chunk):
+    parse = parse_number if _config['format'] == 'num' else parse_moves
+    results = []
+    for line in chunk:
+        try:
+            x, o, turn = parse(line, _config['first'])
+            if (x | o) == BOARD_MASK:
+                raise ValueError("board is full")
+            game = Game(None, turn, options=set(), x=x, o=o, table=_table, depth=_config['depth'])
+            _table.new_search()
+            if _config['time_limit'] is None:
+                move, score = game.search(_config['depth'])
+            else:
+                move, score = game.iterative_deepening(_config['time_limit'])
+            results.append({'position': line, 'move': move, 'score': score,
+                            'depth': game.depth_reached, 'nodes': game.nodes})
+        except ValueError as e:
+            results.append({'position': line, 'error': str(e)})
+    return results
+
+
+def chunks(lines, size):
+    stripped = (line.strip() for line in lines)
+    positions = (line for line in stripped if line)
+    while True:
+        chunk = list(islice(positions, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def analyze(lines, out, config, processes=None, chunk_size=64, ordered=True):
+    """Stream positions from `lines` to a process pool and write one JSON
+    object per position to `out`. At most a few chunks per worker are in
+    flight at any time, so memory does not grow with the input."""
+    with ProcessPoolExecutor(processes, initializer=_init, initargs=(config,)) as pool:
+        window = 4 * (processes or os.cpu_count() or 1)
+        pending = deque()
+        source = chunks(lines, chunk_size)
+        for chunk in source:
+            pending.append(pool.submit(analyze_chunk, chunk))
+            if len(pending) < window:
+                continue
+            if ordered:
+                write(out, pending.popleft().result())
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    write(out, future.result())
+        while pending:
+            write(out, pending.popleft().result())
+
+
+def write(out, results):
+    for result in results:
+        out.write(json.dumps(result) + '\n')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze positions, one per line, and write JSONL results")
+    parser.add_argument('input', nargs='?', help="input file (default: stdin)")
+    parser.add_argument('--output', help="output file (default: stdout)")
+    parser.add_argument('--format', choices=['moves', 'num'], default='moves',
+                        help="moves: 0-based column digits, e.g. 3324; num: the base-3 Board.num")
+    parser.add_argument('--first', choices=['X', '0'], default='X', help="colour that moved first")
+    parser.add_argument('--depth', type=int, default=8)
+    parser.add_argument('--time-limit', type=float, help="per-position budget; enables iterative deepening")
+    parser.add_argument('--table-size', type=int, default=1 << 18)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--chunk-size', type=int, default=64)
+    parser.add_argument('--unordered', action='store_true', help="write results as they complete")
+    args = parser.parse_args()
+
+    config = {'format': args.format, 'first': args.first, 'depth': args.depth,
+              'time_limit': args.time_limit, 'table_size': args.table_size}
+    source = open(args.input) if args.input else sys.stdin
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        analyze(source, out, config, args.processes, args.chunk_size, not args.unordered)
+    finally:
+        if args.input:
+            source.close()
+        if args.output:
+            out.close()
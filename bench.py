@@ -0,0 +1,424 @@
+import argparse
+import contextlib
+import copy
+import io
+import json
+import multiprocessing
+import resource
+import sys
+import time
+
+import numpy as np
+
+import connectfour2
+import connectfour3
+import codec
+import connectfourIM
+import mcts
+import simulate
+
+# Move sequences (0-based columns) for the fixed position corpus. None of them
+# contains a finished game.
+CORPUS = [
+    '',
+    '3',
+    '33',
+    '3242',
+    '332211',
+    '3344521',
+    '33332244',
+    '2345432',
+    '0123456012',
+    '3333222444',
+    '33445516',
+    '32233445',
+]
+SEARCH_DEPTHS = (4, 6, 8)
+LOOK_AHEAD_CORPUS = ['614335523223310351']
+MIN_TIME = 0.2
+MEMORY_POSITION = '61433552322331035'
+MEMORY_DEPTHS = (7, 8, 9, 10)
+MEMORY_MODES = {
+    'look_ahead_tree': {'engine': 'minimax'},
+    'look_ahead_lean': {'engine': 'minimax', 'tree': False},
+    'alphabeta': {},
+}
+ORDERINGS = ('static', 'killers', 'history')
+THREAT_DEPTHS = (4, 6)
+# Pondering has to give the move back quickly once the opponent answers.
+PONDER_THINK = 0.3
+PONDER_CANCEL_LIMIT = 0.1
+# (width, height, connect) board variants, searched from the empty board and
+# two short openings in the centre columns.
+VARIANTS = ((7, 6, 4), (8, 7, 4), (9, 7, 4), (9, 7, 5))
+VARIANT_SEARCH_DEPTH = 7
+VARIANT_LOOK_AHEAD_DEPTH = 5
+
+
+def rate(fn, items):
+    count, start = 0, time.perf_counter()
+    while True:
+        for item in items:
+            fn(item)
+        count += len(items)
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_TIME:
+            return round(count / elapsed)
+
+
+def turn_of(ply):
+    return 'X' if ply % 2 == 0 else '0'
+
+
+def cf2_position(moves):
+    game = connectfour2.Game([[' ' for _ in range(6)] for _ in range(7)], 'X')
+    for ply, col in enumerate(moves):
+        game.turn = turn_of(ply)
+        game.move = (int(col), game.place(int(col)))
+        if int(col) in game.options and game.board[int(col)][0] != ' ':
+            game.options.remove(int(col))
+    return game
+
+
+def cf2_child(game):
+    board = copy.deepcopy(game.board)
+    unfilled = copy.deepcopy(game.options)
+    return connectfour2.State(board, unfilled, game.turn, game.move)
+
+
+def cf3_position(moves):
+    board = connectfour3.Board([[' ' for _ in range(6)] for _ in range(7)], 'X', options=set(range(7)))
+    for ply, col in enumerate(moves):
+        board.turn = turn_of(ply)
+        board.move = (int(col), board.place(int(col)))
+    return board
+
+
+def im_position(moves):
+    state = connectfourIM.Board([' ' * 6 for _ in range(7)], 'X', options=set(range(7)))
+    for ply, col in enumerate(moves):
+        state.turn = turn_of(ply)
+        state.make_move(int(col))
+    return state
+
+
+def im_game(moves, width=connectfourIM.WIDTH, height=connectfourIM.HEIGHT, **kwargs):
+    game = connectfourIM.Game([' ' * height for _ in range(width)], 'X', options=set(range(width)),
+                              width=width, height=height, **kwargs)
+    for ply, col in enumerate(moves):
+        game.turn = turn_of(ply)
+        game.make_move(int(col))
+    game.turn = turn_of(len(moves))
+    return game
+
+
+def first_option(options):
+    return min(options, key=lambda c: abs(c - 3))
+
+
+def im_child(board):
+    # connectfourIM searches in place: a child is play_xo followed by unplay_xo.
+    col, turn, move = first_option(board.options), board.turn, board.move
+    board.swap_turn()
+    board.play_xo(col)
+    board.unplay_xo(col)
+    board.turn, board.move = turn, move
+
+
+def first_open(board):
+    return first_option([c for c in range(7) if board.empty(c)])
+
+
+def bench_cf2():
+    games = [cf2_position(m) for m in CORPUS if m]
+    return {
+        'check_win_per_sec': rate(lambda g: g.check_win(), games),
+        'make_child_per_sec': rate(cf2_child, games),
+    }
+
+
+def bench_cf3():
+    boards = [cf3_position(m) for m in CORPUS if m]
+    states = [connectfour3.State(b) for b in boards]
+    return {
+        'check_win_per_sec': rate(lambda b: b.check_win(), boards),
+        'make_child_per_sec': rate(lambda s: s.make_child(first_open(s.board)), states),
+    }
+
+
+def bench_im():
+    states = [im_position(m) for m in CORPUS if m]
+    results = {
+        'check_win_per_sec': rate(lambda s: s.check_win(), states),
+        'make_child_per_sec': rate(im_child, states),
+    }
+    for depth in SEARCH_DEPTHS:
+        nodes, elapsed = 0, 0.0
+        for moves in CORPUS:
+            game = im_game(moves)
+            start = time.perf_counter()
+            game.search(depth)
+            elapsed += time.perf_counter() - start
+            nodes += game.nodes
+        results[f'search_depth_{depth}'] = {
+            'nodes': nodes,
+            'seconds': round(elapsed, 4),
+            'nodes_per_sec': round(nodes / elapsed),
+        }
+    nodes, elapsed = 0, 0.0
+    for moves in LOOK_AHEAD_CORPUS:
+        # Without threat pruning: the corpus position has a forced move, and
+        # this metric tracks the cost of a full expansion.
+        game = im_game(moves, engine='minimax', threats=False)
+        state = connectfourIM.State(turn_of(len(moves) - 1), game.move)
+        start = time.perf_counter()
+        game.look_ahead(state)
+        elapsed += time.perf_counter() - start
+        nodes += game.unique + game.found
+    results['look_ahead'] = {
+        'nodes': nodes,
+        'seconds': round(elapsed, 4),
+        'nodes_per_sec': round(nodes / elapsed),
+    }
+    return results
+
+
+def bench_codec():
+    pairs = [codec.xo_from_moves(m) for m in CORPUS]
+    numbers = [codec.number_from_xo(x, o) for x, o in pairs]
+    batch = CORPUS * 10000
+    start = time.perf_counter()
+    codes = codec.encode(*codec.encode_moves(batch))
+    decoded = codec.numbers_from_codes(codes)
+    encode_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    codec.decode(codec.codes_from_numbers(decoded))
+    decode_seconds = time.perf_counter() - start
+    return {
+        'number_from_xo_per_sec': rate(lambda p: codec.number_from_xo(*p), pairs),
+        'xo_from_number_per_sec': rate(codec.xo_from_number, numbers),
+        'bulk_moves_to_numbers_per_sec': round(len(batch) / encode_seconds),
+        'bulk_numbers_to_xo_per_sec': round(len(batch) / decode_seconds),
+    }
+
+
+def bench_simulate():
+    engine = mcts.MCTS(playout='random', seed=0)
+    rng = np.random.default_rng(0)
+    batch = 100000
+    start = time.perf_counter()
+    simulate.playouts(batch, rng=rng)
+    elapsed = time.perf_counter() - start
+    return {
+        'scalar_playouts_per_sec': rate(lambda _: engine.random_playout(0, 0), [None] * 100),
+        'batched_playouts_per_sec': round(batch / elapsed),
+    }
+
+
+def bench_ponder():
+    """Time from the opponent's answer to the pondering thread having
+    stopped, after PONDER_THINK seconds of pondering on each corpus
+    position. Fails if any cancel takes longer than PONDER_CANCEL_LIMIT."""
+    latencies = []
+    for moves in CORPUS:
+        game = im_game(moves, ponder=True)
+        game.start_pondering()
+        time.sleep(PONDER_THINK)
+        start = time.perf_counter()
+        game.stop_pondering()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    if latencies[-1] > PONDER_CANCEL_LIMIT:
+        raise RuntimeError(f"ponder cancel took {latencies[-1]:.3f}s, limit {PONDER_CANCEL_LIMIT}s")
+    return {
+        'cancel_ms_p50': round(1000 * latencies[len(latencies) // 2], 2),
+        'cancel_ms_max': round(1000 * latencies[-1], 2),
+    }
+
+
+def run():
+    results = {}
+    for name, fn in (('connectfour2', bench_cf2), ('connectfour3', bench_cf3), ('connectfourIM', bench_im),
+                     ('codec', bench_codec), ('simulate', bench_simulate), ('ponder', bench_ponder)):
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[name] = fn()
+        except Exception as e:
+            results[name] = {'error': repr(e)}
+    return results
+
+
+def _memory_worker(config, depth, results):
+    game = im_game(MEMORY_POSITION, depth=depth, **config)
+    start = time.perf_counter()
+    game.choose_move()
+    elapsed = time.perf_counter() - start
+    results.put((round(elapsed, 4), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def run_memory():
+    """Peak resident set size of one engine move at each depth, measured in a
+    fresh process per run so earlier runs do not inflate the peak."""
+    results = {}
+    for mode, config in MEMORY_MODES.items():
+        results[mode] = {}
+        for depth in MEMORY_DEPTHS:
+            queue = multiprocessing.Queue()
+            proc = multiprocessing.Process(target=_memory_worker, args=(config, depth, queue))
+            proc.start()
+            seconds, peak_kb = queue.get()
+            proc.join()
+            results[mode][f'depth_{depth}'] = {'seconds': seconds, 'peak_rss_kb': peak_kb}
+    return results
+
+
+def run_ordering():
+    """Search size and the share of cutoffs found by the first move tried,
+    for every move ordering, over the corpus at each search depth."""
+    results = {}
+    for ordering in ORDERINGS:
+        results[ordering] = {}
+        for depth in SEARCH_DEPTHS:
+            nodes, cutoffs, first = 0, 0, 0
+            for moves in CORPUS:
+                game = im_game(moves, depth=depth, ordering=ordering, stats=True)
+                game.choose_move()
+                nodes += sum(game.stats.nodes)
+                cutoffs += game.stats.cutoffs
+                first += game.stats.first_move_cutoffs
+            results[ordering][f'depth_{depth}'] = {
+                'nodes': nodes,
+                'first_move_cutoff_rate': round(first / cutoffs, 4) if cutoffs else 0.0,
+            }
+    return results
+
+
+def run_threats():
+    """look_ahead nodes and time over the corpus with and without the
+    forced-move and threat pruning, at each depth."""
+    results = {}
+    for depth in THREAT_DEPTHS:
+        runs = {}
+        for threats in (False, True):
+            nodes, elapsed = 0, 0.0
+            for moves in CORPUS + LOOK_AHEAD_CORPUS:
+                game = im_game(moves, engine='minimax', depth=depth, threats=threats)
+                start = time.perf_counter()
+                game.choose_move()
+                elapsed += time.perf_counter() - start
+                nodes += game.unique + game.found
+            runs['pruned' if threats else 'full'] = {'nodes': nodes, 'seconds': round(elapsed, 4)}
+        runs['node_reduction'] = round(1 - runs['pruned']['nodes'] / runs['full']['nodes'], 4)
+        results[f'depth_{depth}'] = runs
+    return results
+
+
+def variant_openings(width):
+    c = width // 2
+    return ['', f'{c}{c}', f'{c}{c - 1}{c + 1}']
+
+
+def _variant_worker(width, height, connect, results):
+    dims = {'width': width, 'height': height, 'connect': connect}
+    nodes, elapsed = 0, 0.0
+    for moves in variant_openings(width):
+        game = im_game(moves, depth=VARIANT_SEARCH_DEPTH, table_size=1 << 18, **dims)
+        start = time.perf_counter()
+        game.search(VARIANT_SEARCH_DEPTH)
+        elapsed += time.perf_counter() - start
+        nodes += game.nodes
+    search = {'nodes': nodes, 'seconds': round(elapsed, 4), 'nodes_per_sec': round(nodes / elapsed)}
+    game = im_game('', depth=VARIANT_LOOK_AHEAD_DEPTH, engine='minimax', **dims)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        game.choose_move()
+    elapsed = time.perf_counter() - start
+    look_ahead = {'nodes': game.unique + game.found, 'seconds': round(elapsed, 4),
+                  'nodes_per_sec': round((game.unique + game.found) / elapsed)}
+    results.put({f'search_depth_{VARIANT_SEARCH_DEPTH}': search,
+                 f'look_ahead_depth_{VARIANT_LOOK_AHEAD_DEPTH}': look_ahead,
+                 'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+
+
+def run_variants():
+    """Alpha-beta and look_ahead throughput and peak RSS for each board
+    variant, each in a fresh process like run_memory."""
+    results = {}
+    for width, height, connect in VARIANTS:
+        queue = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=_variant_worker, args=(width, height, connect, queue))
+        proc.start()
+        results[f'{width}x{height}_connect{connect}'] = queue.get()
+        proc.join()
+    return results
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)):
+            flat[prefix + key] = value
+    return flat
+
+
+# Metrics where a larger value is better; everything else (times, node
+# counts, memory, latencies) regresses upwards.
+HIGHER_IS_BETTER = ('per_sec', 'first_move_cutoff_rate', 'node_reduction')
+
+
+def compare(results, baseline, tolerance):
+    """Return the metrics that got worse than the baseline by more than
+    `tolerance` (a fraction), and those missing from the results, such as
+    the metrics of a benchmark section that raised."""
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for metric, old in previous.items():
+        new = current.get(metric)
+        if new is None:
+            regressions.append({'metric': metric, 'baseline': old, 'current': None, 'change': None})
+            continue
+        if not old:
+            continue
+        change = (new - old) / old
+        if metric.endswith(HIGHER_IS_BETTER):
+            worse = change < -tolerance
+        else:
+            worse = change > tolerance
+        if worse:
+            regressions.append({'metric': metric, 'baseline': old, 'current': new, 'change': round(change, 3)})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark move generation, win detection and search")
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--memory', action='store_true', help='measure peak RSS of look_ahead and search at depths 7-10')
+    parser.add_argument('--ordering', action='store_true', help='compare node counts of the move orderings')
+    parser.add_argument('--threats', action='store_true', help='look_ahead node counts with and without threat pruning')
+    parser.add_argument('--variants', action='store_true', help='search speed and memory on larger boards and connect-5')
+    args = parser.parse_args()
+
+    if args.memory:
+        results = run_memory()
+    elif args.ordering:
+        results = run_ordering()
+    elif args.threats:
+        results = run_threats()
+    elif args.variants:
+        results = run_variants()
+    else:
+        results = run()
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print(json.dumps({'regressions': regressions}, indent=2))
+        sys.exit(1 if regressions else 0)
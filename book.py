@@ -0,0 +1,96 @@
+import argparse
+import mmap
+import struct
+
+from connectfourIM import Game, BOTTOM_MASK, BOARD_MASK, COLUMNS, WIDTH, has_won
+from codec import number_from_xo
+
+# Each record is the 9-byte big-endian key followed by the best column and
+# the search score, so byte order of the keys is numeric order.
+KEY_BYTES = 9
+RECORD = struct.Struct('>9sBh')
+
+
+def book_key(num, turn):
+    return (2 * num + (turn == 'X')).to_bytes(KEY_BYTES, 'big')
+
+
+def positions(max_ply):
+    seen = set()
+    for first in ('X', '0'):
+        stack = [(0, 0, first, 0)]
+        while stack:
+            x, o, turn, ply = stack.pop()
+            key = book_key(number_from_xo(x, o), turn)
+            if key in seen:
+                continue
+            seen.add(key)
+            yield key, x, o, turn
+            if ply == max_ply:
+                continue
+            mask = x | o
+            legal = (mask + BOTTOM_MASK) & BOARD_MASK
+            for col in range(WIDTH):
+                bit = legal & COLUMNS[col]
+                if not bit:
+                    continue
+                if turn == 'X':
+                    if not has_won(x | bit):
+                        stack.append((x | bit, o, '0', ply + 1))
+                elif not has_won(o | bit):
+                    stack.append((x, o | bit, 'X', ply + 1))
+
+
+def build_book(path, max_ply=4, depth=10, table_size=1 << 20):
+    game = Game(None, 'X', options=set(range(WIDTH)), table_size=table_size)
+    records = []
+    for key, x, o, turn in positions(max_ply):
+        game.x_repr, game.o_repr, game.turn = x, o, turn
+        game.table.new_search()
+        move, score = game.search(depth)
+        records.append(RECORD.pack(key, move, score))
+    records.sort()
+    with open(path, 'wb') as f:
+        f.write(b''.join(records))
+    return len(records)
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size() else b''
+        self.count = len(self.mm) // RECORD.size
+
+    def size(self):
+        self.file.seek(0, 2)
+        return self.file.tell()
+
+    def lookup(self, num, turn):
+        key = book_key(num, turn)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mid * RECORD.size
+            probe = self.mm[start:start + KEY_BYTES]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                _, move, score = RECORD.unpack_from(self.mm, start)
+                return move, score
+        return None
+
+    def close(self):
+        if self.count:
+            self.mm.close()
+        self.file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the connectfourIM opening book")
+    parser.add_argument('path')
+    parser.add_argument('--ply', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=10)
+    args = parser.parse_args()
+    print(build_book(args.path, args.ply, args.depth), "positions written")
@@ -0,0 +1,212 @@
+"""Conversions between the position encodings used across the project.
+
+    moves     sequence of 0-based columns, e.g. '3324' (bench, analyze, solver)
+    number    base-3 Board.num: digit HEIGHT*c + h is the cell at height h of
+              column c, 0 empty, 1 for '0', 2 for 'X' (book, server)
+    x, o      bitboards in the connectfourIM layout
+    map       list of column strings, top cell first (Board.map); lists of
+              lists as in connectfour2/3 are accepted too
+
+Everything goes through one code per column: the base-3 value of its
+HEIGHT digits. Lookup tables map a column's pair of bit patterns to its code
+and back, so a conversion is a few table lookups per column with no string
+building and no floating point.
+
+The NumPy functions do the same for whole batches. A batch of positions is
+an (N, WIDTH) array of column codes; a full base-3 number does not fit in
+64 bits, so numbers_from_codes assembles Python ints from 64-bit chunks of
+columns.
+"""
+import numpy as np
+
+from connectfourIM import WIDTH, HEIGHT, H1, COLUMN_MASK, STANDARD, str_val
+
+BASE = 3 ** HEIGHT
+COLUMN_POWERS = [BASE ** c for c in range(WIDTH)]
+# Columns per chunk whose base-3 value still fits in an unsigned 64-bit int.
+CHUNK = max(k for k in range(1, WIDTH + 1) if BASE ** k <= 1 << 64)
+
+CELL = {' ': 0, '0': str_val['0'], 'X': str_val['X']}
+CHAR = {v: k for k, v in CELL.items()}
+
+# CODE[x_col << HEIGHT | o_col] is the column code, -1 for overlapping or
+# floating stones; COLUMN_X/COLUMN_O/COLUMN_STRING[code] invert it, with -1
+# and None for codes that are not a stack of stones.
+CODE = [-1] * (1 << 2 * HEIGHT)
+COLUMN_X = [-1] * BASE
+COLUMN_O = [-1] * BASE
+COLUMN_STRING = [None] * BASE
+for _height in range(HEIGHT + 1):
+    for _x in range(1 << _height):
+        _o = ((1 << _height) - 1) ^ _x
+        _digits = [str_val['X'] if _x >> h & 1 else str_val['0'] for h in range(_height)]
+        _code = sum(d * 3 ** h for h, d in enumerate(_digits))
+        CODE[_x << HEIGHT | _o] = _code
+        COLUMN_X[_code], COLUMN_O[_code] = _x, _o
+        COLUMN_STRING[_code] = ''.join(CHAR[d] for d in reversed(_digits)).rjust(HEIGHT)
+
+_CODE = np.array(CODE, dtype=np.int32)
+_COLUMN_X = np.array(COLUMN_X, dtype=np.int64)
+_COLUMN_O = np.array(COLUMN_O, dtype=np.int64)
+
+
+def column_codes(x, o):
+    codes = []
+    for c in range(WIDTH):
+        code = CODE[((x >> c * H1) & COLUMN_MASK) << HEIGHT | ((o >> c * H1) & COLUMN_MASK)]
+        if code < 0:
+            raise ValueError("invalid stones in column %d" % c)
+        codes.append(code)
+    return codes
+
+
+def xo_from_codes(codes):
+    x = o = 0
+    for c, code in enumerate(codes):
+        if COLUMN_X[code] < 0:
+            raise ValueError("floating piece in column %d" % c)
+        x |= COLUMN_X[code] << c * H1
+        o |= COLUMN_O[code] << c * H1
+    return x, o
+
+
+def number_from_xo(x, o):
+    return sum(code * power for code, power in zip(column_codes(x, o), COLUMN_POWERS))
+
+
+def xo_from_number(n):
+    if not 0 <= n < BASE ** WIDTH:
+        raise ValueError("number out of range")
+    codes = []
+    for _ in range(WIDTH):
+        n, code = divmod(n, BASE)
+        codes.append(code)
+    return xo_from_codes(codes)
+
+
+def xo_from_moves(moves, first='X', v=STANDARD):
+    """Bitboards after playing `moves` (0-based columns) from the empty
+    board of variant `v`. Raises ValueError for a move that does not fit in
+    its column and for a position whose game is already won."""
+    own = other = 0
+    for col in moves:
+        col = int(col)
+        mask = own | other
+        bit = (mask + v.bottom_mask) & v.board_mask & v.columns[col] if 0 <= col < v.width else 0
+        if not bit:
+            raise ValueError("illegal move %s" % col)
+        own |= bit
+        if v.has_won(own):
+            raise ValueError("game already won")
+        own, other = other, own
+    if len(moves) % 2:
+        own, other = other, own
+    return (own, other) if first == 'X' else (other, own)
+
+
+def map_from_xo(x, o):
+    return [COLUMN_STRING[code] for code in column_codes(x, o)]
+
+
+def xo_from_map(board):
+    x = o = 0
+    for c, column in enumerate(board):
+        for h, cell in enumerate(reversed(column)):
+            if cell == 'X':
+                x |= 1 << (c * H1 + h)
+            elif cell == '0':
+                o |= 1 << (c * H1 + h)
+    column_codes(x, o)
+    return x, o
+
+
+def number_from_map(board):
+    return number_from_xo(*xo_from_map(board))
+
+
+def map_from_number(n):
+    return map_from_xo(*xo_from_number(n))
+
+
+def rows_from_xo(x, o):
+    """Display rows, top row first, with '.' for empty cells."""
+    columns = map_from_xo(x, o)
+    return [''.join(column[i] for column in columns).replace(' ', '.') for i in range(HEIGHT)]
+
+
+def encode(x, o):
+    """(N, WIDTH) column codes of N positions given as bitboard arrays."""
+    x = np.asarray(x, dtype=np.uint64)
+    o = np.asarray(o, dtype=np.uint64)
+    codes = np.empty((len(x), WIDTH), dtype=np.int32)
+    for c in range(WIDTH):
+        shift = np.uint64(c * H1)
+        xc = (x >> shift) & np.uint64(COLUMN_MASK)
+        oc = (o >> shift) & np.uint64(COLUMN_MASK)
+        codes[:, c] = _CODE[(xc << np.uint64(HEIGHT) | oc).astype(np.intp)]
+    if (codes < 0).any():
+        raise ValueError("invalid stones in position %d" % np.flatnonzero((codes < 0).any(1))[0])
+    return codes.astype(np.uint16)
+
+
+def decode(codes):
+    """Bitboard arrays (x, o) of an (N, WIDTH) array of column codes."""
+    codes = np.asarray(codes, dtype=np.intp)
+    xs, os = _COLUMN_X[codes], _COLUMN_O[codes]
+    if (xs < 0).any():
+        raise ValueError("floating piece in position %d" % np.flatnonzero((xs < 0).any(1))[0])
+    shifts = np.arange(WIDTH, dtype=np.uint64) * np.uint64(H1)
+    x = (xs.astype(np.uint64) << shifts).sum(1, dtype=np.uint64)
+    o = (os.astype(np.uint64) << shifts).sum(1, dtype=np.uint64)
+    return x, o
+
+
+def numbers_from_codes(codes):
+    """Base-3 numbers of an (N, WIDTH) array of column codes, as an object
+    array of Python ints."""
+    codes = np.asarray(codes, dtype=np.uint64)
+    numbers = np.zeros(len(codes), dtype=object)
+    for start in range(0, WIDTH, CHUNK):
+        chunk = np.zeros(len(codes), dtype=np.uint64)
+        for c in range(min(WIDTH, start + CHUNK) - 1, start - 1, -1):
+            chunk = chunk * np.uint64(BASE) + codes[:, c]
+        numbers += chunk.astype(object) * COLUMN_POWERS[start]
+    return numbers
+
+
+def codes_from_numbers(numbers):
+    """(N, WIDTH) column codes of base-3 numbers given as ints or decimal
+    strings."""
+    numbers = np.array([int(n) for n in numbers], dtype=object)
+    if len(numbers) and ((numbers < 0) | (numbers >= BASE ** WIDTH)).any():
+        raise ValueError("number out of range")
+    codes = np.empty((len(numbers), WIDTH), dtype=np.uint16)
+    for start in range(0, WIDTH, CHUNK):
+        chunk = (numbers // COLUMN_POWERS[start] % BASE ** CHUNK).astype(np.uint64)
+        for c in range(start, min(WIDTH, start + CHUNK)):
+            chunk, codes[:, c] = np.divmod(chunk, np.uint64(BASE))
+    return codes
+
+
+def encode_moves(sequences, first='X'):
+    """Bitboard arrays (x, o) after each of N move strings, built one ply at
+    a time across the whole batch."""
+    length = max((len(s) for s in sequences), default=0)
+    plies = np.frombuffer(''.join(s.ljust(length) for s in sequences).encode(), dtype=np.uint8)
+    plies = plies.reshape(len(sequences), length).astype(np.int16) - ord('0')
+    rows = np.arange(len(sequences))
+    heights = np.zeros((len(sequences), WIDTH), dtype=np.int16)
+    stones = [np.zeros(len(sequences), dtype=np.uint64), np.zeros(len(sequences), dtype=np.uint64)]
+    for ply in range(length):
+        cols = plies[:, ply]
+        played = cols != ord(' ') - ord('0')
+        bad = played & ((cols < 0) | (cols >= WIDTH))
+        cols = np.where(played & ~bad, cols, 0)
+        height = heights[rows, cols]
+        bad |= played & (height >= HEIGHT)
+        if bad.any():
+            raise ValueError("illegal move in sequence %d" % np.flatnonzero(bad)[0])
+        heights[rows, cols] += played
+        bits = np.left_shift(np.uint64(1), (cols * H1 + height).astype(np.uint64))
+        stones[ply % 2] |= np.where(played, bits, np.uint64(0))
+    return (stones[0], stones[1]) if first == 'X' else (stones[1], stones[0])
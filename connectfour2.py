@@ -236,9 +236,6 @@ class Game:
             counter += 1
 
     def look_ahead(self, state: State, depth=0):
-        print(depth)
-        print(state.unfilled)
-
         for s in state.unfilled:
             new_board = copy.deepcopy(state.board)
             new_unfilled = copy.deepcopy(state.unfilled)
@@ -1,42 +1,330 @@
 import random
 import copy
-import math
+import time
+import json
+import threading
+from array import array
+
+from heuristic import Evaluator, TWO, THREE, CENTER, PARITY
 
 str_val = {"0": 1, "X": 2}
-val_str = {"0": " ", "1": "0", "2": "X"}
 
-def to_base_3(n):
-    if n == 0:
-        return '0' * 6
-    digits = []
-    while n:
-        digits.append(str(n % 3))
-        n //= 3
-    return ''.join(digits[::-1]).rjust(6, '0')
+WIN_SCORE = 1000
+
+
+def run_steps(connect):
+    """Shift multipliers for finding runs of `connect` stones by doubling:
+    after m &= m >> (step * shift) for every step, bit i of m is set when
+    bits i, i+shift, ..., i+(connect-1)*shift all were."""
+    steps, run = [], 1
+    while 2 * run <= connect:
+        steps.append(run)
+        run *= 2
+    if run < connect:
+        steps.append(connect - run)
+    return steps
+
+
+def win_test(height, connect):
+    """has_won for boards of the given height and win length."""
+    h1 = height + 1
+    shifts = (1, h1, height, h1 + 1)
+    if connect == 4:
+        def has_won(bb):
+            for shift in shifts:
+                m = bb & (bb >> shift)
+                if m & (m >> (2 * shift)):
+                    return True
+            return False
+        return has_won
+    steps = run_steps(connect)
+
+    def has_won(bb):
+        for shift in shifts:
+            m = bb
+            for step in steps:
+                m &= m >> (step * shift)
+            if m:
+                return True
+        return False
+    return has_won
+
+
+class Variant:
+    """Board size and win length, with the bitboard masks and lookup tables
+    that depend on them.
+
+    Bitboard layout: column c owns bits c*h1 .. c*h1+height, bit c*h1+h is
+    the cell at height h counted from the bottom. The top bit of every
+    column stays empty so that shifts never carry a line from one column
+    into the next."""
+
+    def __init__(self, width=7, height=6, connect=4):
+        self.width, self.height, self.connect = width, height, connect
+        self.h1 = h1 = height + 1
+        self.cells = width * height
+        self.column_mask = (1 << height) - 1
+        self.bottom_mask = sum(1 << (c * h1) for c in range(width))
+        self.board_mask = self.bottom_mask * self.column_mask
+        self.columns = [self.column_mask << (c * h1) for c in range(width)]
+        self.move_order = sorted(range(width), key=lambda c: (abs(2 * c - width + 1), c))
+        # Both middle columns on even widths, so that the centre bonus is
+        # mirror-symmetric like the tables that share mirrored positions.
+        self.center_columns = tuple(sorted({(width - 1) // 2, width // 2}))
+        self.center_mask = sum(self.columns[c] for c in self.center_columns)
+        self.has_won = win_test(height, connect)
+        self.evaluator = Evaluator(width, height, connect, WIN_SCORE)
+
+        # The winning lines as bit indices and masks, and for every cell the
+        # indices of the lines that pass through it.
+        self.lines = [tuple(line) for line in self.evaluator.winning_lines()]
+        self.line_masks = [sum(1 << i for i in line) for line in self.lines]
+        self.cell_lines = [tuple(j for j, line in enumerate(self.lines) if i in line) for i in range(width * h1)]
+        self.line_value = tuple(THREE if k == connect - 1 else TWO if k == connect - 2 else 0
+                                for k in range(connect + 1))
+
+        # Zobrist keys are indexed by the parity of the move that placed the
+        # stone (first or second player) and the bit index of the cell.
+        rng = random.Random(0xC4)
+        self.zobrist = [[rng.getrandbits(64) for _ in range(width * h1)] for _ in range(2)]
+        # mirror[i] is the bit index of cell i reflected left to right.
+        self.mirror = [(width - 1 - i // h1) * h1 + i % h1 for i in range(width * h1)]
+        self.zobrist_mirror = [[keys[self.mirror[i]] for i in range(width * h1)] for keys in self.zobrist]
+
+    def line_counts(self, bb):
+        return bytearray(bin(bb & m).count('1') for m in self.line_masks)
+
+    def line_score(self, x_lines, o_lines):
+        line_value = self.line_value
+        score = 0
+        for xc, oc in zip(x_lines, o_lines):
+            if not oc:
+                score += line_value[xc]
+            elif not xc:
+                score -= line_value[oc]
+        return score
+
+    def column_heights(self, mask):
+        return bytearray(bin((mask >> (c * self.h1)) & self.column_mask).count('1') for c in range(self.width))
+
+    def decisive(self, score):
+        return abs(score) >= WIN_SCORE - self.cells
+
+    def mirror_bits(self, bb):
+        out = 0
+        for c in range(self.width):
+            out |= ((bb >> (c * self.h1)) & self.column_mask) << ((self.width - 1 - c) * self.h1)
+        return out
+
+    def zobrist_key(self, cur, mask, moves):
+        key = 0
+        side = moves & 1
+        for i in range(self.width * self.h1):
+            if cur >> i & 1:
+                key ^= self.zobrist[side][i]
+            elif mask >> i & 1:
+                key ^= self.zobrist[side ^ 1][i]
+        return key
+
+
+_variants = {}
+
+
+def variant(width=7, height=6, connect=4):
+    key = (width, height, connect)
+    if key not in _variants:
+        _variants[key] = Variant(width, height, connect)
+    return _variants[key]
+
+
+# The standard 7x6 connect-4 board, whose tables the rest of the project
+# imports directly.
+STANDARD = variant()
+WIDTH, HEIGHT, H1, CONNECT = STANDARD.width, STANDARD.height, STANDARD.h1, STANDARD.connect
+COLUMN_MASK, BOTTOM_MASK, BOARD_MASK = STANDARD.column_mask, STANDARD.bottom_mask, STANDARD.board_mask
+COLUMNS, MOVE_ORDER = STANDARD.columns, STANDARD.move_order
+has_won = STANDARD.has_won
+EVALUATOR = STANDARD.evaluator
+LINES, LINE_MASKS, CELL_LINES, LINE_VALUE = STANDARD.lines, STANDARD.line_masks, STANDARD.cell_lines, STANDARD.line_value
+ZOBRIST, MIRROR, ZOBRIST_MIRROR = STANDARD.zobrist, STANDARD.mirror, STANDARD.zobrist_mirror
+line_counts, line_score, column_heights = STANDARD.line_counts, STANDARD.line_score, STANDARD.column_heights
+decisive, mirror_bits, zobrist_key = STANDARD.decisive, STANDARD.mirror_bits, STANDARD.zobrist_key
+
+EXACT, LOWER, UPPER = 0, 1, 2
+# Nodes between two checks of the time, node and stop budgets: reading the
+# clock at every node would cost more than the node, while 256 nodes take
+# under ten milliseconds, which bounds both the overshoot of a time limit
+# and how long a cancelled ponder search keeps running.
+CHECK_NODES = 256
+
+
+class SearchTimeout(Exception):
+    pass
 
-def to_base_2(n):
-    digits = []
-    while n:
-        digits.append(str(n % 2))
-        n //= 2
-    return ''.join(digits[::-1]).rjust(42, '0')
+
+def ordered_moves(legal, first=None, order=MOVE_ORDER, columns=COLUMNS):
+    if first is not None and legal & columns[first]:
+        yield first
+    for col in order:
+        if col != first and legal & columns[col]:
+            yield col
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results, indexed by the low bits of
+    the Zobrist key. A slot is overwritten when it is empty, holds the same
+    position, was written during an older search, or was searched to a
+    depth no greater than the new entry.
+
+    Callers store positions under the smaller of the key and its mirror
+    image's key; `mirrors` records which orientation wrote the entry.
+
+    Given a writable `buffer` of nbytes(size) bytes (e.g. a SharedMemory
+    block), the fields are laid out in it instead of in private arrays so
+    that several processes can share one table.
+
+    Each slot is two 64-bit words: the entry packed into `data`, and `checks`
+    holding key ^ data. Two processes writing the same slot at once can leave
+    one writer's check next to the other's data; such a slot then fails the
+    check in probe instead of returning another position's result."""
+
+    FIELDS = (('checks', 'Q'), ('data', 'Q'))
+
+    def __init__(self, size=1 << 20, buffer=None):
+        self.size = size
+        self.age = 1
+        offset = 0
+        for name, code in self.FIELDS:
+            width = array(code).itemsize * size
+            if buffer is None:
+                setattr(self, name, array(code, bytes(width)))
+            else:
+                setattr(self, name, buffer[offset:offset + width].cast(code))
+            offset += width
+
+    @classmethod
+    def nbytes(cls, size):
+        return sum(array(code).itemsize * size for _, code in cls.FIELDS)
+
+    def release(self):
+        for name, _ in self.FIELDS:
+            field = getattr(self, name)
+            if isinstance(field, memoryview):
+                field.release()
+
+    def new_search(self):
+        self.age = self.age % 255 + 1
+
+    # data layout, low bits first: value (16, two's complement), flag (2),
+    # depth (8), move + 1 (8, 0 for none), mirrored (1), age (8; 0 = empty).
+    @staticmethod
+    def pack(value, flag, depth, move, mirrored, age):
+        return ((value & 0xFFFF) | flag << 16 | depth << 18 | (0 if move is None else move + 1) << 26
+                | bool(mirrored) << 34 | age << 35)
+
+    def probe(self, key):
+        i = key & (self.size - 1)
+        data = self.data[i]
+        if self.checks[i] ^ data != key or not data >> 35:
+            return None
+        value = data & 0xFFFF
+        move = (data >> 26 & 0xFF) - 1
+        return (value - 0x10000 if value & 0x8000 else value, data >> 16 & 3, data >> 18 & 0xFF,
+                None if move < 0 else move, data >> 34 & 1)
+
+    def store(self, key, value, flag, depth, move, mirrored=False):
+        """Write an entry; returns True when it evicted a different live position."""
+        i = key & (self.size - 1)
+        old = self.data[i]
+        evicted = old >> 35 != 0 and self.checks[i] ^ old != key
+        if evicted and old >> 35 == self.age and old >> 18 & 0xFF > depth:
+            return False
+        data = self.pack(value, flag, depth, move, mirrored, self.age)
+        self.data[i] = data
+        self.checks[i] = key ^ data
+        return evicted
+
+
+class SearchStats:
+    """Counters for one engine move, collected when Game(stats=True)."""
+
+    def __init__(self):
+        self.nodes = []
+        self.probes = 0
+        self.hits = 0
+        self.mirror_hits = 0
+        self.overwrites = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.table_cutoffs = 0
+        self.leaf_evals = 0
+        self.depth = 0
+        self.seconds = 0.0
+
+    def node(self, ply):
+        while len(self.nodes) <= ply:
+            self.nodes.append(0)
+        self.nodes[ply] += 1
+
+    def branching_factor(self):
+        total = sum(self.nodes)
+        if not total or not self.depth:
+            return 0.0
+        return total ** (1 / self.depth)
+
+    def as_dict(self):
+        return {
+            'depth': self.depth,
+            'seconds': round(self.seconds, 6),
+            'nodes': sum(self.nodes),
+            'nodes_per_ply': self.nodes,
+            'branching_factor': round(self.branching_factor(), 3),
+            'probes': self.probes,
+            'hits': self.hits,
+            'hit_rate': round(self.hits / self.probes, 4) if self.probes else 0.0,
+            'mirror_hits': self.mirror_hits,
+            'overwrites': self.overwrites,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoff_rate': round(self.first_move_cutoffs / self.cutoffs, 4) if self.cutoffs else 0.0,
+            'table_cutoffs': self.table_cutoffs,
+            'leaf_evals': self.leaf_evals,
+        }
+
+    def write_jsonl(self, path, **extra):
+        with open(path, 'a') as f:
+            f.write(json.dumps(dict(self.as_dict(), **extra)) + '\n')
 
 
 class Board:
-    def __init__(self, board, turn, move=None, options={0,1,2,3,4,5,6}, n=0, x=None, o=None) -> None:
+    def __init__(self, board, turn, move=None, options=None, n=0, x=None, o=None, width=WIDTH, height=HEIGHT, connect=CONNECT) -> None:
+        self.variant = v = variant(width, height, connect)
         self.map = board
         self.turn = turn
         self.move = move
         self.move_val = None
-        self.options = options
+        self.options = set(range(width)) if options is None else options
         self.num = n
-        self.x_repr = x
-        self.o_repr = o
+        self.x_repr = x or 0
+        self.o_repr = o or 0
+        self.heights = v.column_heights(self.x_repr | self.o_repr)
+        self.x_lines, self.o_lines = v.line_counts(self.x_repr), v.line_counts(self.o_repr)
+        center = v.center_mask
+        self.score = v.line_score(self.x_lines, self.o_lines) + CENTER * (
+            bin(self.x_repr & center).count('1') - bin(self.o_repr & center).count('1'))
+        # The empty cell of every open three, counted per cell for X and 0,
+        # and the threat-parity balance for X when X or 0 moved first.
+        self.gaps = (bytearray(v.width * v.h1), bytearray(v.width * v.h1))
+        self.parity = [0, 0]
+        for l, m in enumerate(v.line_masks):
+            if self.x_lines[l] == connect - 1 and not self.o_lines[l]:
+                self.add_three(0, (m & ~self.x_repr).bit_length() - 1, 1)
+            elif self.o_lines[l] == connect - 1 and not self.x_lines[l]:
+                self.add_three(1, (m & ~self.o_repr).bit_length() - 1, 1)
 
     def display(self):
-        for i in range(6):
+        for i in range(self.variant.height):
             str = ''
-            for y in range(7):
+            for y in range(self.variant.width):
                 if self.map[y][i] == ' ':
                     str += '.'
                 else:
@@ -46,46 +334,158 @@ class Board:
         #     print(' '.join(row))
 
     def display_number(self):
-        for i in range(7):
-            col_num = self.isolate_column_number(i)
-            base_3_num = to_base_3(col_num)
-            self.map[i] = ''.join(val_str[j] for j in base_3_num)
+        height = self.variant.height
+        n, self.map = self.num, []
+        for _ in range(self.variant.width):
+            n, col_num = divmod(n, 3 ** height)
+            self.map.append(''.join(' 0X'[col_num // 3 ** h % 3] for h in range(height - 1, -1, -1)))
         self.display()
 
     def display_number_xo(self):
-        xs = to_base_2(self.x_repr)
-        os = to_base_2(self.o_repr)
-        for i in range(6):
+        v = self.variant
+        for h in range(v.height - 1, -1, -1):
             row = ''
-            for y in range(7):
-                if xs[i*7 + y] == '1':
-                    row += 'X'
-                elif os[i*7 + y] == '1':
-                    row += '0'
-                else:
-                    row += '.'
+            for c in range(v.width):
+                bit = 1 << (c * v.h1 + h)
+                row += 'X' if self.x_repr & bit else '0' if self.o_repr & bit else '.'
             print(row)
 
     def nearest_power_of_3(self, n):
-        if n == 0:
-            return 1
-        elif n == 1:
-            return 3
-
-        return int(3 ** math.ceil(math.log(n, 3)))
+        # The smallest power of 3 above n: the place value of the next free
+        # cell of a column whose base-3 value is n.
+        power = 1
+        while power <= n:
+            power *= 3
+        return power
 
     def isolate_column_number_xo(self, pos):
-        pass
+        v = self.variant
+        shift = pos * v.h1
+        return (self.x_repr >> shift) & v.column_mask, (self.o_repr >> shift) & v.column_mask
+
+    def mask(self):
+        return self.x_repr | self.o_repr
+
+    def canonical_xo(self):
+        x, o = self.x_repr, self.o_repr
+        mx, mo = self.variant.mirror_bits(x), self.variant.mirror_bits(o)
+        if (mx, mo) < (x, o):
+            return (mx, mo), True
+        return (x, o), False
+
+    def legal_moves(self):
+        return (self.mask() + self.variant.bottom_mask) & self.variant.board_mask
+
+    def add_three(self, side, gap, n):
+        # X's (side 0) threes on odd rows and 0's on even rows favour X when
+        # X moved first; the other way round when 0 did.
+        self.gaps[side][gap] += n
+        self.parity[(gap % self.variant.h1 & 1) ^ side] += n if side == 0 else -n
+
+    def update_xo(self, pos):
+        v = self.variant
+        line_value = v.line_value
+        three = v.connect - 1
+        cell = pos * v.h1 + self.heights[pos]
+        x_lines, o_lines = self.x_lines, self.o_lines
+        score = self.score
+        if self.turn == 'X':
+            self.x_repr |= 1 << cell
+            for l in v.cell_lines[cell]:
+                xc, oc = x_lines[l], o_lines[l]
+                if not oc:
+                    score += line_value[xc + 1] - line_value[xc]
+                    if xc == three:
+                        self.add_three(0, cell, -1)
+                    elif xc + 1 == three:
+                        self.add_three(0, (v.line_masks[l] & ~self.x_repr).bit_length() - 1, 1)
+                elif not xc:
+                    score += line_value[oc]
+                    if oc == three:
+                        self.add_three(1, cell, -1)
+                x_lines[l] = xc + 1
+            if pos in v.center_columns:
+                score += CENTER
+        else:
+            self.o_repr |= 1 << cell
+            for l in v.cell_lines[cell]:
+                xc, oc = x_lines[l], o_lines[l]
+                if not xc:
+                    score -= line_value[oc + 1] - line_value[oc]
+                    if oc == three:
+                        self.add_three(1, cell, -1)
+                    elif oc + 1 == three:
+                        self.add_three(1, (v.line_masks[l] & ~self.o_repr).bit_length() - 1, 1)
+                elif not oc:
+                    score -= line_value[xc]
+                    if xc == three:
+                        self.add_three(0, cell, -1)
+                o_lines[l] = oc + 1
+            if pos in v.center_columns:
+                score -= CENTER
+        self.score = score
+        self.heights[pos] += 1
+        return v.height - self.heights[pos]
+
+    def play_xo(self, pos):
+        row = self.update_xo(pos)
+        self.move = (pos, row)
+        if row == 0:
+            self.options.remove(pos)
+
+    def unplay_xo(self, pos):
+        v = self.variant
+        line_value = v.line_value
+        three = v.connect - 1
+        if self.heights[pos] == v.height:
+            self.options.add(pos)
+        self.heights[pos] -= 1
+        cell = pos * v.h1 + self.heights[pos]
+        x_lines, o_lines = self.x_lines, self.o_lines
+        score = self.score
+        if self.x_repr >> cell & 1:
+            for l in v.cell_lines[cell]:
+                xc, oc = x_lines[l] - 1, o_lines[l]
+                if not oc:
+                    score -= line_value[xc + 1] - line_value[xc]
+                    if xc == three:
+                        self.add_three(0, cell, 1)
+                    elif xc + 1 == three:
+                        self.add_three(0, (v.line_masks[l] & ~self.x_repr).bit_length() - 1, -1)
+                elif not xc:
+                    score -= line_value[oc]
+                    if oc == three:
+                        self.add_three(1, cell, 1)
+                x_lines[l] = xc
+            self.x_repr ^= 1 << cell
+            if pos in v.center_columns:
+                score -= CENTER
+        else:
+            for l in v.cell_lines[cell]:
+                xc, oc = x_lines[l], o_lines[l] - 1
+                if not xc:
+                    score += line_value[oc + 1] - line_value[oc]
+                    if oc == three:
+                        self.add_three(1, cell, 1)
+                    elif oc + 1 == three:
+                        self.add_three(1, (v.line_masks[l] & ~self.o_repr).bit_length() - 1, -1)
+                elif not oc:
+                    score += line_value[xc]
+                    if xc == three:
+                        self.add_three(0, cell, 1)
+                o_lines[l] = oc
+            self.o_repr ^= 1 << cell
+            if pos in v.center_columns:
+                score += CENTER
+        self.score = score
 
     def isolate_column_number(self, pos):
-        top = self.num % (3 ** (6 * (pos + 1)))
-        bottom = 3 ** (6 * pos)
-        # print("Isolated Column number is: " + str(math.floor(top/bottom)))
-        return math.floor(top/bottom)
+        height = self.variant.height
+        return self.num // 3 ** (height * pos) % 3 ** height
 
     def update_number(self, pos):
         col_num = self.isolate_column_number(pos)
-        col_update = str_val[self.turn] * self.nearest_power_of_3(col_num) * (3 ** (6 * pos))
+        col_update = str_val[self.turn] * self.nearest_power_of_3(col_num) * 3 ** (self.variant.height * pos)
         self.num += col_update
         self.move_val = col_update
         return self.num
@@ -104,10 +504,12 @@ class Board:
         self.update_number(pos)
 
     def place(self, pos):
-        for i in range(6):
-            if i == 5 or self.map[pos][i + 1] != ' ':
+        bottom = self.variant.height - 1
+        for i in range(bottom + 1):
+            if i == bottom or self.map[pos][i + 1] != ' ':
                 print
                 self.map[pos] = self.map[pos][:i] + self.turn + self.map[pos][i+1:]
+                self.update_xo(pos)
                 return i
 
     def check_down(self, count):
@@ -124,7 +526,13 @@ class Board:
     def check_win(self):
         if self.move is None:
             return False
-        return self.vertical_win() or self.horizontal_win() or self.diagonal_win()
+        pos, row = self.move
+        v = self.variant
+        counts = self.x_lines if self.turn == 'X' else self.o_lines
+        for l in v.cell_lines[pos * v.h1 + v.height - 1 - row]:
+            if counts[l] == v.connect:
+                return True
+        return False
 
     def end_game(self):
         if self.check_win():
@@ -135,85 +543,37 @@ class Board:
             return True
         return False
 
-    def vertical_win(self):
-        ranges = self.straight_ranges(max(0, self.move[1] - 3), min(5, self.move[1] + 3))
-        for range in ranges:
-            if all(self.map[self.move[0]][r] == self.turn for r in range):
-                return True
-        return False
-
-    def horizontal_win(self):
-        ranges = self.straight_ranges(max(0, self.move[0] - 3), min(6, self.move[0] + 3))
-        for range in ranges:
-            if all(self.map[c][self.move[1]] == self.turn for c in range):
-                return True
-        return False
-
-    def diagonal_win(self):
-        for dir in self.diagonal_ranges():
-            for i in range(len(dir) - 3):
-                if all(self.map[dir[j][0]][dir[j][1]] == self.turn for j in range(i, i + 4)):
-                    return True
-        return False
-
     def check_draw(self):
-        for row in self.map:
-            if ' ' in row:
-                return False
-        return True
-
-    def straight_ranges(self, start, end):
-        ranges = []
-        while start + 3 <= end:
-            ranges.append(range(start, start + 4))
-            start += 1
-        return ranges
-
-    def diagonal_ranges(self):
-        fronthand_ranges = []
-        backhand_ranges = []
-
-        lat, lon = self.move
-        for _ in range(4):
-            if lat >= 0 and lon >= 0:
-                fronthand_ranges.append((lat, lon))
-                lat -= 1
-                lon -= 1
-
-        fronthand_ranges.reverse()
-        lat, lon = self.move
-        for _ in range(3):
-            if lat < 6 and lon < 5:
-                lat += 1
-                lon += 1
-                fronthand_ranges.append((lat, lon))
-
-        lat, lon = self.move
-        for _ in range(4):
-            if lat >= 0 and lon < 6:
-                backhand_ranges.append((lat, lon))
-                lat -= 1
-                lon += 1
-
-        backhand_ranges.reverse()
-        lat, lon = self.move
-        for _ in range(3):
-            if lat < 6 and lon >= 1:
-                lat += 1
-                lon -= 1
-                backhand_ranges.append((lat, lon))
-
-        return fronthand_ranges, backhand_ranges
+        return self.mask() == self.variant.board_mask
 
     def evaluate(self):
-        return 0
+        # The Evaluator's score for the player who did not just move, kept
+        # up to date move by move and given from X's side: a playable three
+        # wins, otherwise the line and centre score plus threat parity.
+        v = self.variant
+        moves = sum(self.heights)
+        side = 1 if self.turn == 'X' else 0
+        gaps = self.gaps[side]
+        for c in range(v.width):
+            if self.heights[c] < v.height and gaps[c * v.h1 + self.heights[c]]:
+                return (WIN_SCORE - moves) / WIN_SCORE * (-1 if side else 1)
+        x_first = (self.turn == 'X') == (moves % 2 == 1)
+        score = self.score + PARITY * self.parity[0 if x_first else 1]
+        return max(-WIN_SCORE + 1, min(WIN_SCORE - 1, score)) / WIN_SCORE
 
-class State(Board):
-    def __init__(self, map, turn, move=None, options={i for i in range(7)}, n=0, x=0, o=0) -> None:
-        super().__init__(map, turn, move, options, n, x, o)
+class State:
+    __slots__ = ('turn', 'move', 'weight', 'offense', 'children', 'mirrored', 'remaining')
+
+    def __init__(self, turn, move=None, mirrored=False) -> None:
+        self.turn = turn
+        self.move = move
         self.weight = None
         self.offense = None
         self.children = dict()
+        # Whether `children` is keyed by columns of the mirrored board, and
+        # how many plies below this node have been searched (-1: none yet).
+        self.mirrored = mirrored
+        self.remaining = -1
 
     def best_move(self):
         max_weight = max(self.children[child].weight for child in self.children)
@@ -227,30 +587,90 @@ class State(Board):
 
         return max_child
 
-    def make_child(self, move):
-        new_map = self.map[:]
-        new_options = self.options.copy()
-        new_state = State(new_map, self.turn, options=new_options, n=self.num)
-        new_state.swap_turn()
-        new_state.make_move(move)
-        self.children[move] = new_state
-        return new_state
-
 
 class Game(Board):
-    def __init__(self, map, turn, move=None, options={i for i in range(7)}, n=0, x=0, o=0) -> None:
-        super().__init__(map, turn, move, options, n, x, o)
+    def __init__(self, map, turn, move=None, options=None, n=0, x=0, o=0, engine='alphabeta', depth=8, table_size=1 << 20, time_limit=None, node_limit=None, book=None, evaluator=EVALUATOR, table=None, workers=1, stats=False, stats_log=None, tree=True, ponder=False, ponder_slice=1.0, ordering='killers', width=WIDTH, height=HEIGHT, connect=CONNECT, playout='heuristic', exploration=1.4, threats=True) -> None:
+        super().__init__(map, turn, move, options, n, x, o, width=width, height=height, connect=connect)
         self.state_pool = dict()
         self.begin_state = None
         self.unique = 0
         self.found = 0
+        self.mirrored = 0
+        self.engine = engine
+        self.depth = depth
+        self.nodes = 0
+        self.table = TranspositionTable(table_size) if table is None else table
+        self.table_size = table_size
+        self.solver = None
+        # engine='mcts': node_limit counts playouts, and the tree is kept
+        # across moves.
+        self.mcts = None
+        self.playout = playout
+        self.exploration = exploration
+        self.workers = workers
+        self.shared_table = None
+        self.stop = None
+        self.move_order = self.variant.move_order
+        # Move ordering for negamax: 'static' tries the hash move and then
+        # move_order; 'killers' puts the two cells that last caused a cutoff
+        # at the same ply right after the hash move; 'history' also sorts the
+        # remaining moves by how much their cell has cut off before, in a
+        # table that lives as long as the game.
+        self.ordering = ordering
+        self.killers = [[None, None] for _ in range(self.variant.cells + 1)]
+        self.history = [[0] * (width * self.variant.h1) for _ in range(2)]
+        self.collect_stats = stats or stats_log is not None
+        self.stats_log = stats_log
+        self.stats = None
+        self.root_moves = 0
+        self.tree = tree
+        # look_ahead only expands the moves threat_moves leaves.
+        self.threats = threats
+        self.ponder = ponder
+        self.ponder_slice = ponder_slice
+        self.ponder_thread = None
+        self.ponder_stop = None
+        self.ponder_move = None
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.deadline = None
+        self.max_nodes = None
+        self.next_check = 0
+        self.depth_reached = 0
+        self.book = book
+        # The default evaluator is the standard board's; other sizes get their own.
+        self.evaluator = self.variant.evaluator if evaluator is EVALUATOR else evaluator
+        # Leaves are scored one at a time: a NumPy batch of a node's few
+        # children costs more than scoring them with bitmasks, and would lose
+        # the cutoffs among them. Evaluators without score() get a batch of one.
+        if self.evaluator is None:
+            self.leaf_score = None
+        elif hasattr(self.evaluator, 'score'):
+            self.leaf_score = self.evaluator.score
+        else:
+            self.leaf_score = lambda cur, mask: self.evaluator([cur], [mask])[0]
+
+    def read_column(self):
+        self.start_pondering()
+        try:
+            return int(input(f"Player {self.turn}, enter position: ")) - 1
+        finally:
+            self.stop_pondering()
 
     def user_turn(self):
-        col = int(input(f"Player {self.turn}, enter position: ")) - 1
-        if col < 0 or col > 6:
+        col = self.read_column()
+        if col < 0 or col >= self.variant.width:
             print("Position out of range!")
             self.user_turn()
         elif self.empty(col):
+            if self.ponder_move is not None:
+                if col == self.ponder_move:
+                    self.ponder_hits += 1
+                else:
+                    self.ponder_misses += 1
+                self.ponder_move = None
             row = self.place(col)
             self.update_number(col)
             self.move = (col, row)
@@ -258,19 +678,166 @@ class Game(Board):
             print("Column already filled")
             self.user_turn()
 
-    def computer_turn(self):
-        self.begin_state = State(self.map, '0', self.move, self.options.copy())
-        self.look_ahead(self.begin_state)
-        best_move = self.begin_state.best_move()
-        col = self.place(best_move[1])
-        self.update_number(best_move[1])
+    def choose_move(self, time_limit=None, node_limit=None):
+        time_limit = self.time_limit if time_limit is None else time_limit
+        node_limit = self.node_limit if node_limit is None else node_limit
+        self.stats = SearchStats() if self.collect_stats else None
+        start = time.perf_counter()
+        # The book holds standard-board positions only.
+        hit = self.book.lookup(self.num, self.turn) if self.book and self.variant is STANDARD else None
+        if hit is not None:
+            best_move = hit[0]
+        elif self.engine == 'minimax':
+            turn, move = self.turn, self.move
+            self.prune_pool()
+            if self.stats is not None:
+                self.stats.node(0)
+            if self.tree:
+                board_id, mirrored = self.canonical_xo()
+                root = self.state_pool.get(board_id)
+                if root is None:
+                    root = State('X' if turn == '0' else '0', move, mirrored)
+                    self.state_pool[board_id] = root
+                self.look_ahead(root)
+                root.remaining = self.depth
+                best_move = root.best_move()[1]
+                if root.mirrored != mirrored:
+                    best_move = self.variant.width - 1 - best_move
+                self.begin_state = root
+            else:
+                best_move = self.look_ahead_root('X' if turn == '0' else '0')
+            self.turn, self.move = turn, move
+            self.depth_reached = self.depth
+        elif self.engine == 'solver':
+            best_move = self.solver_move(time_limit, node_limit)
+        elif self.engine == 'mcts':
+            from mcts import MCTS
+            if self.mcts is None:
+                self.mcts = MCTS(self.variant, self.exploration, self.playout)
+            cur = self.x_repr if self.turn == 'X' else self.o_repr
+            best_move = self.mcts.search(cur, self.mask(), node_limit, time_limit)
+            self.nodes += self.mcts.iterations
+        else:
+            best_move = self.alphabeta_move(time_limit, node_limit)
+        if self.stats is not None:
+            self.stats.seconds = time.perf_counter() - start
+            self.stats.depth = self.depth_reached
+            if self.stats_log is not None:
+                self.stats.write_jsonl(self.stats_log, move=best_move, position=self.num)
+        return best_move
+
+    def alphabeta_move(self, time_limit, node_limit):
+        self.table.new_search()
+        self.new_history()
+        if self.workers > 1:
+            from smp import parallel_search
+            return parallel_search(self, self.workers, time_limit, max_depth=self.depth if time_limit is None else self.variant.cells)[0]
+        if time_limit is None and node_limit is None:
+            return self.search(self.depth)[0]
+        return self.iterative_deepening(time_limit, node_limit)[0]
+
+    def solver_move(self, time_limit, node_limit):
+        # Exact play from solver.MIN_STONES stones on; earlier positions take
+        # the solver hours, so they get the alpha-beta move instead. Under a
+        # time or node limit the solver gets half of it, and alpha-beta the
+        # rest if the position does not solve in time.
+        from solver import Solver, MIN_STONES
+        if self.variant is not STANDARD:
+            raise ValueError("the solver only handles the standard 7x6 connect-4 board")
+        stones = bin(self.mask()).count('1')
+        if stones >= MIN_STONES:
+            if self.solver is None:
+                self.solver = Solver(self.table_size)
+            self.solver.nodes = 0
+            try:
+                best_move, _ = self.solver.solve(self.x_repr if self.turn == 'X' else self.o_repr, self.mask(),
+                                                 None if time_limit is None else time_limit / 2,
+                                                 None if node_limit is None else node_limit // 2)
+            except SearchTimeout:
+                best_move = None
+            self.nodes += self.solver.nodes
+            if best_move is not None:
+                self.depth_reached = self.variant.cells - stones
+                return best_move
+            time_limit = None if time_limit is None else time_limit / 2
+            node_limit = None if node_limit is None else node_limit - node_limit // 2
+        return self.alphabeta_move(time_limit, node_limit)
+
+    def computer_turn(self, time_limit=None, node_limit=None):
+        best_move = self.choose_move(time_limit, node_limit)
+        col = self.place(best_move)
+        self.update_number(best_move)
         if col == 0:
-            self.options.remove(best_move[1])
-        self.move = (best_move[1], col)
-        self.unique, self.found = 0, 0
+            self.options.remove(best_move)
+        self.move = (best_move, col)
+        self.unique, self.found, self.mirrored, self.nodes = 0, 0, 0, 0
+        self.next_check = 0
         print(f"Computer plays at {self.move[0] + 1}")
-        self.begin_state = None
-        self.state_pool = dict()
+
+    def expected_reply(self):
+        cur = self.x_repr if self.turn == 'X' else self.o_repr
+        mask = self.mask()
+        moves = bin(mask).count('1')
+        v = self.variant
+        key = v.zobrist_key(cur, mask, moves)
+        mkey = v.zobrist_key(v.mirror_bits(cur), v.mirror_bits(mask), moves)
+        entry = self.table.probe(min(key, mkey))
+        if entry is None or entry[3] is None:
+            return None
+        move = entry[3]
+        return v.width - 1 - move if mkey < key else move
+
+    def start_pondering(self):
+        if not self.ponder or self.engine != 'alphabeta' or self.ponder_thread is not None:
+            return
+        legal = self.legal_moves()
+        if not legal or self.check_win():
+            return
+        replies = list(ordered_moves(legal, self.expected_reply(), self.move_order, self.variant.columns))
+        self.ponder_move = replies[0]
+        self.ponder_stop = threading.Event()
+        self.ponder_thread = threading.Thread(target=self.ponder_replies, args=(replies, self.ponder_stop), daemon=True)
+        self.ponder_thread.start()
+
+    def ponder_replies(self, replies, stop):
+        # Runs while the opponent thinks: searches the position after each
+        # likely reply, filling the shared table, until stopped. The expected
+        # reply gets as much time per round as all the others together.
+        v = self.variant
+        human = self.turn
+        computer = 'X' if human == '0' else '0'
+        legal = self.legal_moves()
+        helpers = []
+        for col in replies:
+            bit = legal & v.columns[col]
+            x, o = (self.x_repr | bit, self.o_repr) if human == 'X' else (self.x_repr, self.o_repr | bit)
+            if v.has_won(x if human == 'X' else o) or x | o == v.board_mask:
+                continue
+            helper = Game(None, computer, options=set(), x=x, o=o, table=self.table, evaluator=self.evaluator,
+                          width=v.width, height=v.height, connect=v.connect)
+            helper.stop = stop
+            helper.history = self.history
+            helpers.append(helper)
+        slice = self.ponder_slice
+        while helpers and not stop.is_set():
+            for i, helper in enumerate(helpers):
+                helper.iterative_deepening(slice * max(1, len(helpers) - 1) if i == 0 else slice)
+                if stop.is_set():
+                    return
+            slice *= 2
+
+    def stop_pondering(self):
+        if self.ponder_thread is None:
+            return
+        self.ponder_stop.set()
+        self.ponder_thread.join()
+        self.ponder_thread, self.ponder_stop = None, None
+
+    def close(self):
+        self.stop_pondering()
+        if self.shared_table is not None:
+            self.shared_table.close()
+            self.shared_table = None
 
     def play(self):
         self.display_number()
@@ -314,34 +881,372 @@ class Game(Board):
             go = input(("press any key to continue, or 'q' to quit"))
             counter += 1
 
+    def prune_pool(self):
+        # Entries with fewer stones than the current position can never be
+        # reached again; everything else is kept for the next search.
+        stones = bin(self.mask()).count('1')
+        self.state_pool = {k: v for k, v in self.state_pool.items() if bin(k[0] | k[1]).count('1') >= stones}
+
+    def threat_moves(self, mover):
+        # The columns worth expanding for `mover`: an immediate win on its
+        # own, else the blocks of the opponent's immediate wins, and never a
+        # move that lets the opponent win in the cell right above it unless
+        # every move does.
+        v = self.variant
+        columns = v.columns
+        legal = ((self.x_repr | self.o_repr) + v.bottom_mask) & v.board_mask
+        moves = [s for s in v.move_order if legal & columns[s]]
+        if not self.threats:
+            return moves
+        own, opp = (self.x_repr, self.o_repr) if mover == 'X' else (self.o_repr, self.x_repr)
+        has_won = v.has_won
+        for s in moves:
+            if has_won(own | (legal & columns[s])):
+                return [s]
+        blocks = [s for s in moves if has_won(opp | (legal & columns[s]))]
+        if blocks:
+            moves = blocks
+        safe = [s for s in moves if not has_won(opp | (((legal & columns[s]) << 1) & v.board_mask))]
+        return safe or moves
+
     def look_ahead(self, state: State, depth=0):
-        for s in state.options:
-            new_state = state.make_child(s)
-            board_id = ''.join(elem for elem in new_state.map)
-            if board_id in self.state_pool:
-                state.children[s] = self.state_pool[board_id]
-                self.found += 1
-            else:
-                self.unique += 1
-                if new_state.check_win():
-                    new_state.weight = 1 if new_state.turn == 'X' else -1
-                    new_state.offense = new_state.weight
-                elif new_state.check_draw():
-                    new_state.weight = 0
-                    new_state.offense = 0
-                elif depth == 7:
-                    new_state.weight = new_state.evaluate()
-                    new_state.offense = 0
+        # Walks the game's own board with play_xo/unplay_xo. Nodes kept from
+        # earlier searches are only re-searched where their horizon is too
+        # shallow, so a subtree explored on a previous move is extended
+        # rather than rebuilt.
+        mover = 'X' if state.turn == '0' else '0'
+        flip = state.mirrored != self.canonical_xo()[1]
+        needed = self.depth - 1 - depth
+        v = self.variant
+        stats = self.stats
+        for s in self.threat_moves(mover):
+            key = v.width - 1 - s if flip else s
+            self.turn = mover
+            self.play_xo(s)
+            self.nodes += 1
+            if stats is not None:
+                stats.node(depth + 1)
+            child = state.children.get(key)
+            if child is None:
+                board_id, mirrored = self.canonical_xo()
+                child = self.state_pool.get(board_id)
+                if stats is not None:
+                    stats.probes += 1
+                if child is not None:
+                    self.found += 1
+                    if stats is not None:
+                        stats.hits += 1
+                    if child.mirrored != mirrored and (self.x_repr, self.o_repr) != board_id:
+                        self.mirrored += 1
+                        if stats is not None:
+                            stats.mirror_hits += 1
+                else:
+                    self.unique += 1
+                    child = State(mover, self.move, mirrored)
+                    self.state_pool[board_id] = child
+                state.children[key] = child
+            if child.remaining < needed:
+                if self.check_win():
+                    child.weight = 1 if mover == 'X' else -1
+                    child.offense = child.weight
+                    child.remaining = v.cells
+                elif self.check_draw():
+                    child.weight = 0
+                    child.offense = 0
+                    child.remaining = v.cells
+                elif needed == 0:
+                    child.weight = self.evaluate()
+                    child.offense = 0
+                    child.remaining = 0
+                    if stats is not None:
+                        stats.leaf_evals += 1
                 else:
-                    self.look_ahead(new_state, depth + 1)
+                    self.look_ahead(child, depth + 1)
+                    # Heuristic leaves score strictly inside (-1, 1), so a
+                    # weight of +-1 is a forced result and never goes stale.
+                    child.remaining = v.cells if abs(child.weight) == 1 else needed
+            self.unplay_xo(s)
 
-                self.state_pool[board_id] = new_state
-        
         state.weight = min(state.children[child].weight for child in state.children)
         if state.turn == 'X':
             state.weight = max(state.children[child].weight for child in state.children)
         state.offense = round(sum(state.children[child].offense for child in state.children)/len(state.children), 3)
 
+    def look_ahead_root(self, last):
+        # Tree-free look_ahead: picks the move State.best_move would pick
+        # while keeping only (weight, offense) per position in the pool.
+        best = None
+        for s in self.threat_moves('X' if last == '0' else '0'):
+            weight, offense = self.look_ahead_child(last, s, 0)
+            if best is None or (weight, offense) > best[:2]:
+                best = (weight, offense, s)
+        return best[2]
+
+    def look_ahead_child(self, last, s, depth):
+        mover = 'X' if last == '0' else '0'
+        needed = self.depth - 1 - depth
+        self.turn = mover
+        self.play_xo(s)
+        self.nodes += 1
+        stats = self.stats
+        board_id, mirrored = self.canonical_xo()
+        entry = self.state_pool.get(board_id)
+        if stats is not None:
+            stats.node(depth + 1)
+            stats.probes += 1
+        if entry is not None and entry[3] >= needed:
+            weight, offense, pooled_mirrored, _ = entry
+            self.found += 1
+            if stats is not None:
+                stats.hits += 1
+            if pooled_mirrored != mirrored and (self.x_repr, self.o_repr) != board_id:
+                self.mirrored += 1
+                if stats is not None:
+                    stats.mirror_hits += 1
+        else:
+            self.unique += 1
+            remaining = needed
+            if self.check_win():
+                weight = offense = 1 if mover == 'X' else -1
+                remaining = self.variant.cells
+            elif self.check_draw():
+                weight = offense = 0
+                remaining = self.variant.cells
+            elif needed == 0:
+                weight, offense = self.evaluate(), 0
+                if stats is not None:
+                    stats.leaf_evals += 1
+            else:
+                weight, offense = self.look_ahead_values(mover, depth + 1)
+                if abs(weight) == 1:
+                    remaining = self.variant.cells
+            self.state_pool[board_id] = (weight, offense, mirrored, remaining)
+        self.unplay_xo(s)
+        return weight, offense
+
+    def look_ahead_values(self, last, depth):
+        low, high, total, count = None, None, 0, 0
+        for s in self.threat_moves('X' if last == '0' else '0'):
+            weight, offense = self.look_ahead_child(last, s, depth)
+            low = weight if low is None else min(low, weight)
+            high = weight if high is None else max(high, weight)
+            total += offense
+            count += 1
+        return (high if last == 'X' else low), round(total / count, 3)
+
+    def iterative_deepening(self, time_limit=None, node_limit=None, max_depth=None, start_depth=1):
+        v = self.variant
+        if max_depth is None:
+            max_depth = v.cells
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.max_nodes = None if node_limit is None else self.nodes + node_limit
+        self.next_check = self.nodes
+        legal = self.legal_moves()
+        # None when the board is full; there is nothing to search then.
+        best_move, best_score = next(ordered_moves(legal, order=self.move_order, columns=v.columns), None), 0
+        self.depth_reached = 0
+        try:
+            for depth in range(start_depth, min(max_depth, v.cells - bin(self.mask()).count('1')) + 1):
+                # A stopped ponder search must not start another iteration.
+                if self.stop is not None and self.stop.is_set():
+                    break
+                best_move, best_score = self.search(depth, best_move)
+                self.depth_reached = depth
+                if v.decisive(best_score):
+                    break
+        except SearchTimeout:
+            pass
+        finally:
+            self.deadline, self.max_nodes = None, None
+        return best_move, best_score
+
+    def out_of_budget(self):
+        if self.stop is not None and self.stop.is_set():
+            return True
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            return True
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    def probe(self, key, mkey):
+        mirrored = mkey < key
+        entry = self.table.probe(mkey if mirrored else key)
+        stats = self.stats
+        if stats is not None:
+            stats.probes += 1
+        if entry is None:
+            self.unique += 1
+            return None
+        value, flag, depth, move, entry_mirrored = entry
+        self.found += 1
+        if stats is not None:
+            stats.hits += 1
+        if entry_mirrored != mirrored and key != mkey:
+            self.mirrored += 1
+            if stats is not None:
+                stats.mirror_hits += 1
+        if mirrored and move is not None:
+            move = self.variant.width - 1 - move
+        return value, flag, depth, move
+
+    def store(self, key, mkey, value, flag, depth, move):
+        mirrored = mkey < key
+        if mirrored and move is not None:
+            move = self.variant.width - 1 - move
+        if self.table.store(mkey if mirrored else key, value, flag, depth, move, mirrored) and self.stats is not None:
+            self.stats.overwrites += 1
+
+    def new_history(self):
+        # Killers only make sense within one search; history is kept across
+        # searches but halved so that old cutoffs fade.
+        for killers in self.killers:
+            killers[0] = killers[1] = None
+        for counts in self.history:
+            for i, count in enumerate(counts):
+                counts[i] = count >> 1
+
+    def order_moves(self, legal, hash_move, moves):
+        if self.ordering == 'static':
+            return ordered_moves(legal, hash_move, self.move_order, self.variant.columns)
+        columns = self.variant.columns
+        killers = self.killers[moves - self.root_moves]
+        history = self.history[moves & 1]
+        keyed = []
+        for col in self.move_order:
+            bit = legal & columns[col]
+            if not bit:
+                continue
+            i = bit.bit_length() - 1
+            if col == hash_move:
+                rank = 1 << 62
+            elif i == killers[0]:
+                rank = 1 << 61
+            elif i == killers[1]:
+                rank = 1 << 60
+            elif self.ordering == 'history':
+                rank = history[i]
+            else:
+                rank = 0
+            keyed.append((rank, col))
+        keyed.sort(key=lambda k: k[0], reverse=True)
+        return [col for _, col in keyed]
+
+    def record_cutoff(self, i, moves, depth):
+        killers = self.killers[moves - self.root_moves]
+        if killers[0] != i:
+            killers[0], killers[1] = i, killers[0]
+        if self.ordering == 'history':
+            self.history[moves & 1][i] += depth * depth
+
+    def search(self, depth, first=None):
+        v = self.variant
+        columns, zobrist, zobrist_mirror = v.columns, v.zobrist, v.zobrist_mirror
+        cur = self.x_repr if self.turn == 'X' else self.o_repr
+        mask = self.mask()
+        moves = bin(mask).count('1')
+        self.root_moves = moves
+        if self.stats is not None:
+            self.stats.node(0)
+        key = v.zobrist_key(cur, mask, moves)
+        mkey = v.zobrist_key(v.mirror_bits(cur), v.mirror_bits(mask), moves)
+        legal = (mask + v.bottom_mask) & v.board_mask
+        entry = self.probe(key, mkey)
+        hash_move = entry[3] if entry else None
+        if first is not None:
+            hash_move = first
+        best_move, alpha = None, -WIN_SCORE
+        for col in ordered_moves(legal, hash_move, self.move_order, columns):
+            bit = legal & columns[col]
+            if v.has_won(cur | bit):
+                self.depth_reached = depth
+                return col, WIN_SCORE - moves
+        side = moves & 1
+        for col in ordered_moves(legal, hash_move, self.move_order, columns):
+            bit = legal & columns[col]
+            i = bit.bit_length() - 1
+            score = -self.negamax(cur ^ mask, mask | bit, key ^ zobrist[side][i], mkey ^ zobrist_mirror[side][i],
+                                  moves + 1, depth - 1, -WIN_SCORE, -alpha)
+            if best_move is None or score > alpha:
+                best_move, alpha = col, score
+        self.store(key, mkey, alpha, EXACT, depth, best_move)
+        self.depth_reached = depth
+        return best_move, alpha
+
+    def negamax(self, cur, mask, key, mkey, moves, depth, alpha, beta):
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.next_check = self.nodes + CHECK_NODES
+            if self.out_of_budget():
+                raise SearchTimeout
+        stats = self.stats
+        if stats is not None:
+            stats.node(moves - self.root_moves)
+        v = self.variant
+        columns = v.columns
+        legal = (mask + v.bottom_mask) & v.board_mask
+        if not legal:
+            return 0
+        has_won = v.has_won
+        for col in v.move_order:
+            bit = legal & columns[col]
+            if bit and has_won(cur | bit):
+                return WIN_SCORE - moves
+        if depth == 0:
+            if self.leaf_score is None:
+                return 0
+            if stats is not None:
+                stats.leaf_evals += 1
+            return self.leaf_score(cur, mask)
+
+        alpha_orig = alpha
+        hash_move = None
+        entry = self.probe(key, mkey)
+        if entry is not None:
+            value, flag, entry_depth, hash_move = entry
+            # A proven win or loss holds at any depth, so it stays usable after
+            # the horizon has moved on (later iterations, later moves).
+            proven = (value > 0 and flag != UPPER or value < 0 and flag != LOWER) and v.decisive(value)
+            if entry_depth >= depth or proven:
+                if flag == EXACT:
+                    return value
+                if flag == LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    if stats is not None:
+                        stats.table_cutoffs += 1
+                    return value
+
+        side = moves & 1
+        best, best_move = -WIN_SCORE, None
+        zobrist, zobrist_mirror = v.zobrist[side], v.zobrist_mirror[side]
+        for n, col in enumerate(self.order_moves(legal, hash_move, moves)):
+            bit = legal & columns[col]
+            i = bit.bit_length() - 1
+            score = -self.negamax(cur ^ mask, mask | bit, key ^ zobrist[i], mkey ^ zobrist_mirror[i],
+                                  moves + 1, depth - 1, -beta, -alpha)
+            if score > best:
+                best, best_move = score, col
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if stats is not None:
+                            stats.cutoffs += 1
+                            if n == 0:
+                                stats.first_move_cutoffs += 1
+                        if self.ordering != 'static':
+                            self.record_cutoff(i, moves, depth)
+                        break
+
+        if best <= alpha_orig:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.store(key, mkey, best, flag, depth, best_move)
+        return best
+
 
 if __name__ == "__main__":
     game = Game([' ' * 6 for _ in range(7)], 'X', None)
@@ -0,0 +1,129 @@
+import numpy as np
+
+TWO = 2
+THREE = 8
+CENTER = 3
+PARITY = 6
+
+
+class Evaluator:
+    """Threat-based scoring of positions from the side to move's point of view.
+
+    Boards are given as the side to move's stones and the occupied mask in
+    the connectfourIM bitboard layout, and are scored a whole batch at a time:
+    immediate wins, open threes and twos in each winning line, stones in the
+    centre column, and threes whose empty cell lies on the row parity that
+    favours their owner (odd rows for the first player, even for the second).
+    """
+
+    def __init__(self, width=7, height=6, connect=4, win_score=1000):
+        self.width, self.height, self.connect = width, height, connect
+        self.h1 = height + 1
+        self.win_score = win_score
+        self.limit = win_score - width * height - 1
+        self.bits = width * self.h1
+        # Bitboards are unpacked in 64-bit words, so boards wider than 64 bits
+        # (9x7 uses 72) take one word per 64 bits.
+        self.words = (self.bits + 63) // 64
+        self.shifts = np.arange(64, dtype=np.uint64)
+        self.rows = np.arange(width * self.h1) % self.h1
+        self.bottom = (self.rows == 0).astype(np.int8)
+        # Both middle columns on even widths, keeping the score mirror-symmetric.
+        center_columns = sorted({(width - 1) // 2, width // 2})
+        self.center = np.array([c * self.h1 + h for c in center_columns for h in range(height)])
+        self.lines = np.array(self.winning_lines())
+
+        # Bitmasks for score(), the single-position version of __call__.
+        self.line_masks = [sum(1 << i for i in line) for line in self.winning_lines()]
+        self.bottom_mask = sum(1 << (c * self.h1) for c in range(width))
+        self.board_mask = self.bottom_mask * ((1 << height) - 1)
+        self.center_mask = sum(((1 << height) - 1) << c * self.h1 for c in center_columns)
+        # Cells on odd rows counted from 1, i.e. even heights.
+        self.odd_rows = self.bottom_mask * sum(1 << h for h in range(0, height, 2))
+
+    def winning_lines(self):
+        lines = []
+        for c in range(self.width):
+            for h in range(self.height):
+                for dc, dh in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_c, end_h = c + dc * (self.connect - 1), h + dh * (self.connect - 1)
+                    if end_c < self.width and 0 <= end_h < self.height:
+                        lines.append([(c + dc * k) * self.h1 + h + dh * k for k in range(self.connect)])
+        return lines
+
+    def unpack(self, bbs):
+        if self.words == 1:
+            words = np.asarray(bbs, dtype=np.uint64)[:, None]
+        else:
+            words = np.array([[(bb >> 64 * w) & 0xFFFFFFFFFFFFFFFF for w in range(self.words)] for bb in bbs],
+                             dtype=np.uint64).reshape(-1, self.words)
+        bits = (words[:, :, None] >> self.shifts) & np.uint64(1)
+        return bits.reshape(len(words), 64 * self.words)[:, :self.bits].astype(np.int8)
+
+    def score(self, cur, mask):
+        """The score __call__ gives one position, computed with bitmasks
+        instead of NumPy, which is faster than a batch of a few boards."""
+        opp = cur ^ mask
+        moves = mask.bit_count()
+        n = self.connect
+        playable = (mask + self.bottom_mask) & self.board_mask
+        own_rows = self.odd_rows if moves % 2 == 0 else self.board_mask & ~self.odd_rows
+        twos = threes = parity = 0
+        win_now = False
+        for m in self.line_masks:
+            own = (cur & m).bit_count()
+            their = (opp & m).bit_count()
+            if not their:
+                if own == n - 1:
+                    threes += 1
+                    gap = m & ~cur
+                    if gap & playable:
+                        win_now = True
+                    if gap & own_rows:
+                        parity += 1
+                elif own == n - 2:
+                    twos += 1
+            if not own:
+                if their == n - 1:
+                    threes -= 1
+                    if not m & ~opp & own_rows:
+                        parity -= 1
+                elif their == n - 2:
+                    twos -= 1
+        if win_now:
+            return self.win_score - moves
+        if moves == self.width * self.height:
+            return 0
+        score = (TWO * twos + THREE * threes + PARITY * parity
+                 + CENTER * ((cur & self.center_mask).bit_count() - (opp & self.center_mask).bit_count()))
+        return max(-self.limit, min(self.limit, score))
+
+    def __call__(self, curs, masks):
+        cur = self.unpack(curs)
+        mask = self.unpack(masks)
+        opp = mask - cur
+        empty = 1 - mask
+        moves = mask.sum(1)
+        below = np.roll(mask, 1, axis=1) | self.bottom
+        playable = empty & below
+
+        own = cur[:, self.lines].sum(2)
+        their = opp[:, self.lines].sum(2)
+        n = self.connect
+        own_open = (own == n - 1) & (their == 0)
+        their_open = (their == n - 1) & (own == 0)
+        # Index of the single empty cell; only meaningful for open n-1 lines.
+        gap = np.minimum((empty[:, self.lines] * self.lines).sum(2), len(self.rows) - 1)
+        win_now = (own_open & (playable[np.arange(len(cur))[:, None], gap] == 1)).any(1)
+
+        score = TWO * (((own == n - 2) & (their == 0)).sum(1) - ((their == n - 2) & (own == 0)).sum(1))
+        score += THREE * (own_open.sum(1) - their_open.sum(1))
+        score += CENTER * (cur[:, self.center].sum(1) - opp[:, self.center].sum(1))
+        odd_row = self.rows[gap] % 2 == 0
+        own_parity = np.where((moves % 2 == 0)[:, None], odd_row, ~odd_row)
+        score += PARITY * ((own_open & own_parity).sum(1) - (their_open & ~own_parity).sum(1))
+
+        score = np.clip(score, -self.limit, self.limit)
+        score = np.where(win_now, self.win_score - moves, score)
+        score = np.where(moves == self.width * self.height, 0, score)
+        return score.tolist()
@@ -0,0 +1,87 @@
+"""Load generator for server.py.
+
+Opens --sessions concurrent connections. Each one plays random legal moves
+against the engine, starting a new game whenever one ends, until
+--duration runs out. It then prints the number of engine moves per second
+and the latency percentiles of `move` requests:
+
+    python server.py --time-limit 0.02 &
+    python loadgen.py --sessions 1000 --duration 30
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from connectfourIM import WIDTH, HEIGHT
+
+
+async def play(args, seed, deadline, latencies, counts):
+    rng = random.Random(seed)
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+
+    async def request(line):
+        writer.write((line + '\n').encode())
+        await writer.drain()
+        reply = (await reader.readline()).decode().split()
+        if not reply or reply[0] != 'ok':
+            raise RuntimeError(f"{line!r} -> {' '.join(reply)!r}")
+        return reply
+
+    try:
+        while time.perf_counter() < deadline:
+            await request('new')
+            heights = [0] * WIDTH
+            status = 'play'
+            while status == 'play' and time.perf_counter() < deadline:
+                col = rng.choice([c for c in range(WIDTH) if heights[c] < HEIGHT])
+                start = time.perf_counter()
+                _, reply, status = await request(f'move {col + 1}')
+                latencies.append(time.perf_counter() - start)
+                heights[col] += 1
+                if reply != '-':
+                    heights[int(reply) - 1] += 1
+                    counts['moves'] += 1
+            counts['games'] += status != 'play'
+        await request('quit')
+    finally:
+        writer.close()
+
+
+async def run(args):
+    latencies = []
+    counts = {'moves': 0, 'games': 0}
+    start = time.perf_counter()
+    deadline = start + args.duration
+    results = await asyncio.gather(*(play(args, args.seed + i, deadline, latencies, counts)
+                                     for i in range(args.sessions)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    errors = [r for r in results if isinstance(r, Exception)]
+    return latencies, counts, elapsed, errors
+
+
+def report(latencies, counts, elapsed, errors, sessions):
+    print(f"sessions={sessions} games={counts['games']} engine_moves={counts['moves']} "
+          f"moves_per_sec={counts['moves'] / elapsed:.1f} errors={len(errors)}")
+    if len(latencies) > 1:
+        q = statistics.quantiles(latencies, n=100)
+        print(f"latency_ms p50={q[49] * 1000:.1f} p90={q[89] * 1000:.1f} p99={q[98] * 1000:.1f} "
+              f"max={max(latencies) * 1000:.1f}")
+    if errors:
+        print(f"first error: {errors[0]!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure server.py throughput and latency")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--unix', help="connect to this Unix socket path instead of TCP")
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    report(*asyncio.run(run(args)), args.sessions)
@@ -0,0 +1,214 @@
+"""Monte Carlo tree search engine for connectfourIM.
+
+Game(engine='mcts') picks moves with UCT instead of a depth-limited
+search, which keeps playing sensibly on wide boards where alpha-beta does
+not get deep enough, and under move budgets too small for even a shallow
+full-width search. Each iteration walks down the tree by UCT, adds one
+child, plays the rest of the game out and backs the result up. The budget
+is a number of iterations (Game's node_limit), a time limit, or
+ITERATIONS when neither is given, and at least one iteration is always
+run; the move played is the most visited root child.
+
+Playouts are 'random' (uniform over legal columns) or 'heuristic', which
+takes an immediate win, blocks the opponent's immediate win and otherwise
+plays at random. The heuristic playouts are slower but much less noisy.
+
+The tree is kept between moves: the next search starts from the node of
+the new position if it is a child or grandchild of the old root, so the
+statistics gathered for the reply actually played are reused.
+
+    python mcts.py --iterations 5000 --playout heuristic 3324
+"""
+import argparse
+import math
+import random
+import time
+
+from connectfourIM import STANDARD, variant
+from codec import xo_from_moves
+
+ITERATIONS = 2000
+
+
+class Node:
+    # `cur` holds the stones of the side to move at this node; `wins` counts
+    # results from the point of view of the player who moved into it.
+    __slots__ = ('cur', 'mask', 'children', 'untried', 'visits', 'wins', 'result')
+
+    def __init__(self, cur, mask, untried, result=None):
+        self.cur, self.mask = cur, mask
+        self.children = {}
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0.0
+        self.result = result
+
+
+class MCTS:
+    def __init__(self, variant=STANDARD, exploration=1.4, playout='heuristic', seed=None):
+        if playout not in ('random', 'heuristic'):
+            raise ValueError("playout must be 'random' or 'heuristic'")
+        self.variant = variant
+        self.exploration = exploration
+        self.playout = self.random_playout if playout == 'random' else self.heuristic_playout
+        self.rng = random.Random(seed)
+        self.root = None
+        self.iterations = 0
+        self.reused = 0
+
+    def untried(self, mask):
+        # Popped from the end, so the centre columns are expanded first.
+        v = self.variant
+        legal = (mask + v.bottom_mask) & v.board_mask
+        return [col for col in reversed(v.move_order) if legal & v.columns[col]]
+
+    def find_root(self, cur, mask):
+        """The node of (cur, mask) in the previous tree, looked for at the old
+        root and up to two plies below it, or a fresh node."""
+        level = [] if self.root is None else [self.root]
+        for _ in range(3):
+            for node in level:
+                if node.mask == mask and node.cur == cur:
+                    return node
+            level = [child for node in level for child in node.children.values()]
+        return Node(cur, mask, self.untried(mask))
+
+    def search(self, cur, mask, iterations=None, time_limit=None):
+        """Best column for the side owning `cur`. The position must not be
+        finished."""
+        self.root = root = self.find_root(cur, mask)
+        self.reused = root.visits
+        if iterations is None and time_limit is None:
+            iterations = ITERATIONS
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.iterations = 0
+        # The budget is checked after each iteration, so that even a zero
+        # budget expands a root child for best_move to pick.
+        while True:
+            self.iterate(root)
+            self.iterations += 1
+            if iterations is not None and self.iterations >= iterations:
+                break
+            # The clock is read every 16 iterations; a playout is cheap.
+            if deadline is not None and self.iterations & 15 == 0 and time.perf_counter() >= deadline:
+                break
+        return self.best_move(root)
+
+    def iterate(self, root):
+        node, path = root, [root]
+        while node.result is None and not node.untried:
+            node = self.select(node)
+            path.append(node)
+        if node.result is None:
+            node = self.expand(node)
+            path.append(node)
+        if node.result is None:
+            reward = 1.0 - self.playout(node.cur, node.mask)
+        else:
+            reward = node.result
+        for n in reversed(path):
+            n.visits += 1
+            n.wins += reward
+            reward = 1.0 - reward
+
+    def select(self, node):
+        c = self.exploration * math.sqrt(math.log(node.visits))
+        best, best_value = None, -1.0
+        for child in node.children.values():
+            value = child.wins / child.visits + c / math.sqrt(child.visits)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+    def expand(self, node):
+        v = self.variant
+        col = node.untried.pop()
+        bit = ((node.mask + v.bottom_mask) & v.board_mask) & v.columns[col]
+        mover, mask = node.cur | bit, node.mask | bit
+        if v.has_won(mover):
+            child = Node(mover ^ mask, mask, [], 1.0)
+        elif mask == v.board_mask:
+            child = Node(mover ^ mask, mask, [], 0.5)
+        else:
+            child = Node(mover ^ mask, mask, self.untried(mask))
+        node.children[col] = child
+        return child
+
+    def best_move(self, root):
+        # A move that wins on the spot is always taken; otherwise the most
+        # visited child, which is less noisy than the best average.
+        for col, child in root.children.items():
+            if child.result == 1.0:
+                return col
+        return max(root.children, key=lambda col: root.children[col].visits)
+
+    def random_playout(self, cur, mask):
+        """Result of a random game from (cur, mask) for the side owning cur:
+        1 win, 0 loss, 0.5 draw."""
+        v = self.variant
+        columns, has_won, width = v.columns, v.has_won, v.width
+        bottom, board = v.bottom_mask, v.board_mask
+        randrange = self.rng.randrange
+        ply = 0
+        while mask != board:
+            legal = (mask + bottom) & board
+            bit = 0
+            while not bit:
+                bit = legal & columns[randrange(width)]
+            cur |= bit
+            mask |= bit
+            if has_won(cur):
+                return 0.0 if ply & 1 else 1.0
+            cur ^= mask
+            ply += 1
+        return 0.5
+
+    def heuristic_playout(self, cur, mask):
+        v = self.variant
+        columns, has_won, width = v.columns, v.has_won, v.width
+        bottom, board = v.bottom_mask, v.board_mask
+        randrange = self.rng.randrange
+        ply = 0
+        while mask != board:
+            legal = (mask + bottom) & board
+            opp = cur ^ mask
+            block = 0
+            for col in range(width):
+                b = legal & columns[col]
+                if b:
+                    if has_won(cur | b):
+                        return 0.0 if ply & 1 else 1.0
+                    if not block and has_won(opp | b):
+                        block = b
+            bit = block
+            while not bit:
+                bit = legal & columns[randrange(width)]
+            cur |= bit
+            mask |= bit
+            cur ^= mask
+            ply += 1
+        return 0.5
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pick moves with Monte Carlo tree search")
+    parser.add_argument('positions', nargs='*', help="move strings of 0-based columns")
+    parser.add_argument('--iterations', type=int)
+    parser.add_argument('--time-limit', type=float)
+    parser.add_argument('--playout', choices=('random', 'heuristic'), default='heuristic')
+    parser.add_argument('--exploration', type=float, default=1.4)
+    parser.add_argument('--size', type=int, nargs=3, default=(7, 6, 4), metavar=('WIDTH', 'HEIGHT', 'CONNECT'))
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    v = variant(*args.size)
+    for text in args.positions or ['']:
+        engine = MCTS(v, args.exploration, args.playout, args.seed)
+        x, o = xo_from_moves(text, v=v)
+        cur, mask = x if len(text) % 2 == 0 else o, x | o
+        start = time.perf_counter()
+        move = engine.search(cur, mask, args.iterations, args.time_limit)
+        seconds = time.perf_counter() - start
+        child = engine.root.children[move]
+        print(f"{text or '-'}: move={move} value={child.wins / child.visits:.3f} "
+              f"iterations={engine.iterations} {engine.iterations / seconds:.0f}/s")
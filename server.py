@@ -0,0 +1,181 @@
+"""asyncio game server for connectfourIM.
+
+Every connection is one game session. Sessions only hold the two bitboards
+and whose turn it is; engine searches run in a bounded process pool where
+each worker keeps one Game and its transposition table for all the
+positions it is asked about. At most --max-pending searches are queued in
+the pool at a time; further requests wait for a slot, and because a
+session sends nothing new until it has its reply, a slow engine pushes the
+wait back onto the clients' sockets instead of into server memory.
+
+Line protocol, one command per line, one reply line per command. Columns
+are numbered 1-7 as in the console game:
+
+    new [seconds]   start a new game, optionally with a per-move time budget
+    move <col>      play col for the side to move; the engine answers
+    go              let the engine play for the side to move
+    board           show the position
+    quit            close the session
+
+Replies are `ok ...` or `error <reason>`. `move` and `go` answer
+`ok <engine column or -> <status>` where status is `play`, the winner
+(`X` or `0`) or `draw`; `board` answers `ok <num> <turn> <status>`.
+
+    python server.py --port 7777 --processes 4 --time-limit 0.05
+    python server.py --unix /tmp/connectfour.sock
+"""
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from connectfourIM import Game, BOTTOM_MASK, BOARD_MASK, COLUMNS, WIDTH, has_won
+from codec import number_from_xo
+
+_game = None
+
+
+def _init(depth, table_size):
+    global _game
+    _game = Game(None, 'X', options=set(), depth=depth, table_size=table_size)
+
+
+def engine_move(x, o, turn, time_limit):
+    game = _game
+    game.x_repr, game.o_repr, game.turn = x, o, turn
+    game.table.new_search()
+    game.new_history()
+    if time_limit is None:
+        move, _ = game.search(game.depth)
+    else:
+        move, _ = game.iterative_deepening(time_limit, max_depth=game.depth)
+    return move
+
+
+class Session:
+    def __init__(self, time_limit=None):
+        self.x = self.o = 0
+        self.turn = 'X'
+        self.result = None
+        self.time_limit = time_limit
+
+    def status(self):
+        return 'play' if self.result is None else self.result
+
+    def play(self, col):
+        if self.result is not None:
+            raise ValueError("game over")
+        legal = ((self.x | self.o) + BOTTOM_MASK) & BOARD_MASK
+        if not 0 <= col < WIDTH or not legal & COLUMNS[col]:
+            raise ValueError("illegal move")
+        bit = legal & COLUMNS[col]
+        if self.turn == 'X':
+            self.x |= bit
+            won = has_won(self.x)
+        else:
+            self.o |= bit
+            won = has_won(self.o)
+        if won:
+            self.result = self.turn
+        elif self.x | self.o == BOARD_MASK:
+            self.result = 'draw'
+        self.turn = '0' if self.turn == 'X' else 'X'
+
+
+class Server:
+    def __init__(self, processes=None, max_pending=None, depth=8, time_limit=None, table_size=1 << 18):
+        self.pool = ProcessPoolExecutor(processes, initializer=_init, initargs=(depth, table_size))
+        self.pending = asyncio.Semaphore(max_pending or 4 * (processes or os.cpu_count() or 1))
+        self.time_limit = time_limit
+        self.sessions = 0
+        self.searches = 0
+
+    async def engine(self, session):
+        async with self.pending:
+            loop = asyncio.get_running_loop()
+            col = await loop.run_in_executor(self.pool, engine_move, session.x, session.o, session.turn,
+                                             session.time_limit)
+        self.searches += 1
+        session.play(col)
+        return f"ok {col + 1} {session.status()}"
+
+    async def command(self, session, words):
+        name, args = words[0], words[1:]
+        if name == 'new':
+            session.__init__(float(args[0]) if args else self.time_limit)
+            return "ok"
+        if name == 'move':
+            if len(args) != 1 or not args[0].isdigit():
+                raise ValueError("usage: move <col>")
+            session.play(int(args[0]) - 1)
+            if session.result is not None:
+                return f"ok - {session.status()}"
+            return await self.engine(session)
+        if name == 'go':
+            if session.result is not None:
+                raise ValueError("game over")
+            return await self.engine(session)
+        if name == 'board':
+            return f"ok {number_from_xo(session.x, session.o)} {session.turn} {session.status()}"
+        if name == 'quit':
+            return "ok"
+        raise ValueError(f"unknown command {name}")
+
+    async def handle(self, reader, writer):
+        self.sessions += 1
+        session = Session(self.time_limit)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                words = line.decode().split()
+                if not words:
+                    continue
+                try:
+                    reply = await self.command(session, words)
+                except ValueError as e:
+                    reply = f"error {e}"
+                writer.write((reply + '\n').encode())
+                await writer.drain()
+                if words[0] == 'quit':
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+async def serve(args):
+    server = Server(args.processes, args.max_pending, args.depth, args.time_limit, args.table_size)
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle, args.unix, backlog=args.backlog)
+    else:
+        listener = await asyncio.start_server(server.handle, args.host, args.port, backlog=args.backlog)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Connect Four games over a line protocol")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--unix', help="listen on this Unix socket path instead of TCP")
+    parser.add_argument('--processes', type=int, help="engine worker processes (default: one per CPU)")
+    parser.add_argument('--max-pending', type=int, help="searches queued in the pool at once (default: 4 per worker)")
+    parser.add_argument('--depth', type=int, default=8, help="search depth, or the depth cap with --time-limit")
+    parser.add_argument('--time-limit', type=float, help="default per-move time budget in seconds")
+    parser.add_argument('--table-size', type=int, default=1 << 18)
+    parser.add_argument('--backlog', type=int, default=1024)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
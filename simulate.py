@@ -0,0 +1,134 @@
+"""Batched random playouts with NumPy.
+
+playouts() plays N random games at once from a common starting position
+or from N positions. The games are uint64 bitboard arrays in the
+connectfourIM layout, plus an (N, width) array of column heights. Every
+step picks a uniformly random legal column for all unfinished games,
+drops the stones and tests the movers' boards for a line, all with array
+operations. Games that finish drop out of the batch.
+
+    python simulate.py --games 1000000 3324
+
+prints the outcome statistics and the playout rate. Boards must fit in
+64 bits, which covers every variant up to 9x6.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from connectfourIM import STANDARD, run_steps, variant
+from codec import xo_from_moves
+
+X_WIN, DRAW, O_WIN = 1, 0, -1
+
+
+def has_won(bbs, v=STANDARD):
+    """Boolean array: which of the uint64 bitboards contain a line."""
+    won = np.zeros(len(bbs), dtype=bool)
+    steps = run_steps(v.connect)
+    for shift in (1, v.h1, v.height, v.h1 + 1):
+        m = bbs
+        for step in steps:
+            m = m & (m >> np.uint64(step * shift))
+        won |= m != 0
+    return won
+
+
+def heights_of(masks, v=STANDARD):
+    heights = np.zeros((len(masks), v.width), dtype=np.int64)
+    for c in range(v.width):
+        column = (masks >> np.uint64(c * v.h1)) & np.uint64(v.column_mask)
+        for h in range(v.height):
+            heights[:, c] += ((column >> np.uint64(h)) & np.uint64(1)).astype(np.int64)
+    return heights
+
+
+def playouts(n, x=0, o=0, turn='X', v=STANDARD, rng=None):
+    """Play n random games from (x, o) with `turn` to move; x and o are ints
+    or arrays of n bitboards. Returns the winner (X_WIN, O_WIN or DRAW), the
+    number of plies played and the first column played of every game. The
+    starting positions must not be finished."""
+    if v.width * v.h1 > 64:
+        raise ValueError("batched playouts need boards of at most 64 bits")
+    rng = np.random.default_rng() if rng is None else rng
+    x = np.broadcast_to(np.asarray(x, dtype=np.uint64), (n,)).copy()
+    o = np.broadcast_to(np.asarray(o, dtype=np.uint64), (n,)).copy()
+    stones = [x, o] if turn == 'X' else [o, x]
+    heights = heights_of(x | o, v)
+    winner = np.zeros(n, dtype=np.int8)
+    plies = np.zeros(n, dtype=np.int16)
+    first = np.full(n, -1, dtype=np.int8)
+    # Indices into the full batch of the games still being played.
+    live = np.arange(n)
+    sign = X_WIN if turn == 'X' else O_WIN
+    offsets = np.arange(v.width, dtype=np.int64) * v.h1
+    ply = 0
+    while len(live):
+        legal = heights < v.height
+        # The largest random key among the legal columns is a uniform choice.
+        keys = rng.random(legal.shape)
+        keys[~legal] = -1.0
+        cols = keys.argmax(1)
+        rows = np.arange(len(live))
+        bits = np.left_shift(np.uint64(1), (offsets[cols] + heights[rows, cols]).astype(np.uint64))
+        heights[rows, cols] += 1
+        mover = stones[ply & 1] | bits
+        stones[ply & 1] = mover
+        if ply == 0:
+            first[live] = cols
+        ply += 1
+        won = has_won(mover, v)
+        full = ~won & (heights == v.height).all(1)
+        done = won | full
+        if done.any():
+            ended = live[done]
+            winner[live[won]] = sign if ply & 1 else -sign
+            plies[ended] = ply
+            keep = ~done
+            live, heights = live[keep], heights[keep]
+            stones = [stones[0][keep], stones[1][keep]]
+    return winner, plies, first
+
+
+def summarize(winner, plies, first, v=STANDARD):
+    """Outcome counts, mean game length and X's score by first column."""
+    stats = {
+        'games': len(winner),
+        'x_wins': int((winner == X_WIN).sum()),
+        'o_wins': int((winner == O_WIN).sum()),
+        'draws': int((winner == DRAW).sum()),
+        'mean_plies': round(float(plies.mean()), 2) if len(plies) else 0.0,
+    }
+    score = (winner.astype(np.float64) + 1) / 2
+    by_column = {}
+    for c in range(v.width):
+        games = first == c
+        if games.any():
+            by_column[c] = {'games': int(games.sum()), 'x_score': round(float(score[games].mean()), 4)}
+    stats['first_move'] = by_column
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched random playouts")
+    parser.add_argument('moves', nargs='?', default='', help="starting position as 0-based columns")
+    parser.add_argument('--games', type=int, default=1000000)
+    parser.add_argument('--batch', type=int, default=100000, help="games simulated at once")
+    parser.add_argument('--size', type=int, nargs=3, default=(7, 6, 4), metavar=('WIDTH', 'HEIGHT', 'CONNECT'))
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    v = variant(*args.size)
+    x, o = xo_from_moves(args.moves, v=v)
+    turn = 'X' if len(args.moves) % 2 == 0 else '0'
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+    start = time.perf_counter()
+    for done in range(0, args.games, args.batch):
+        results.append(playouts(min(args.batch, args.games - done), x, o, turn, v, rng))
+    elapsed = time.perf_counter() - start
+    stats = summarize(*(np.concatenate(r) for r in zip(*results)), v)
+    stats['playouts_per_sec'] = round(stats['games'] / elapsed)
+    print(stats)
@@ -0,0 +1,116 @@
+"""Lazy-SMP parallel search for connectfourIM.
+
+Every worker process runs its own iterative deepening on the same root and
+shares one TranspositionTable laid out in a SharedMemory block, so work done
+by one worker cuts off and orders the search of the others. Odd workers start
+one ply deeper and every helper uses a perturbed column order so that they
+do not all walk the tree in lockstep. The first worker to finish (time out,
+reach max_depth or prove a result) stops the rest, and the deepest completed
+result wins.
+
+Benchmark (time to reach a fixed depth from the positions in BENCH_OPENINGS
+for 1, 2, 4, ... workers):
+
+    python smp.py --depth 12 --workers 1 2 4 8 16 32
+
+prints one line per worker count with the mean wall time and the speedup
+over a single worker. Speedup is bounded by the number of physical cores.
+"""
+import argparse
+import multiprocessing
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+from connectfourIM import Game, TranspositionTable, MOVE_ORDER, WIDTH, HEIGHT
+
+BENCH_OPENINGS = [[], [3, 3], [3, 2, 4], [2, 4, 3, 3], [3, 3, 3, 3, 2, 4]]
+
+
+class SharedTable:
+    def __init__(self, size):
+        self.shm = SharedMemory(create=True, size=TranspositionTable.nbytes(size))
+        self.table = TranspositionTable(size, self.shm.buf)
+
+    def close(self):
+        self.table.release()
+        self.shm.close()
+        self.shm.unlink()
+
+
+def helper_order(worker_id, move_order=MOVE_ORDER):
+    order = list(move_order)
+    if worker_id:
+        i = worker_id % (len(order) - 1)
+        order[i], order[i + 1] = order[i + 1], order[i]
+    return order
+
+
+def _worker(name, size, age, x, o, turn, settings, history, time_limit, max_depth, worker_id, stop, results):
+    shm = SharedMemory(name=name)
+    table = TranspositionTable(size, shm.buf)
+    table.age = age
+    game = Game(None, turn, options=set(), x=x, o=o, table=table, **settings)
+    game.history = history
+    game.stop = stop
+    game.move_order = helper_order(worker_id, game.variant.move_order)
+    move, score = game.iterative_deepening(time_limit, max_depth=max_depth, start_depth=1 + worker_id % 2)
+    stop.set()
+    results.put((worker_id, game.depth_reached, move, score, game.nodes))
+    table.release()
+    shm.close()
+
+
+def parallel_search(game, workers, time_limit=None, max_depth=None):
+    v = game.variant
+    if max_depth is None:
+        max_depth = v.cells
+    # The workers search with the parent's engine settings and start from
+    # its history table.
+    settings = {'evaluator': game.evaluator, 'ordering': game.ordering,
+                'width': v.width, 'height': v.height, 'connect': v.connect}
+    if game.shared_table is None:
+        game.shared_table = SharedTable(game.table.size)
+        game.table = game.shared_table.table
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_worker, args=(game.shared_table.shm.name, game.table.size, game.table.age,
+                                                           game.x_repr, game.o_repr, game.turn, settings,
+                                                           game.history, time_limit, max_depth,
+                                                           i, stop, results))
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+    done = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    game.nodes += sum(r[4] for r in done)
+    _, depth, move, score, _ = max(done, key=lambda r: (r[1], -r[0]))
+    game.depth_reached = depth
+    return move, score
+
+
+def bench(depth, worker_counts):
+    base = None
+    for workers in worker_counts:
+        elapsed = 0
+        for opening in BENCH_OPENINGS:
+            game = Game([' ' * 6 for _ in range(WIDTH)], 'X', options=set(range(WIDTH)), table_size=1 << 18)
+            for i, col in enumerate(opening):
+                game.turn = 'X' if i % 2 == 0 else '0'
+                game.make_move(col)
+            game.turn = 'X' if len(opening) % 2 == 0 else '0'
+            start = time.perf_counter()
+            parallel_search(game, workers, max_depth=min(depth, WIDTH * HEIGHT - len(opening)))
+            elapsed += time.perf_counter() - start
+            game.close()
+        elapsed /= len(BENCH_OPENINGS)
+        base = base or elapsed
+        print(f"workers={workers} time_to_depth={elapsed:.3f}s speedup={base / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lazy-SMP time-to-depth benchmark")
+    parser.add_argument('--depth', type=int, default=12)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    bench(args.depth, args.workers)
@@ -0,0 +1,239 @@
+"""Strong solver for connectfourIM positions.
+
+Unlike Game.search, which stops at a depth horizon and scores the frontier
+heuristically, Solver.solve searches to the end of the game and returns the
+exact value of the position together with the column that achieves it.
+
+Internally scores use the compact scale of Pons' solver: a win with the
+winning stone as the k-th stone of the winner scores (WIDTH*HEIGHT/2 + 1 - k),
+a loss the negation of that, and a draw 0. The root value is found by a
+sequence of null-window searches that bisect the range of possible scores
+(MTD(f) style), with the bisection pulled towards 0 because small windows
+around the draw value are the cheapest to refute. The search only ever
+expands moves that do not hand the opponent an immediate win and orders
+them by the number of winning cells they create. Results are reported in
+the WIN_SCORE convention of connectfourIM, so `decisive` applies.
+
+Corpus check (exact values of the positions in solved.txt, with timings):
+
+    python solver.py --check solved.txt
+
+Solving positions:
+
+    python solver.py 3324 33332244
+
+Positions are move strings of 0-based columns, as in bench.py and
+analyze.py. Late middlegame positions solve in well under a second, but
+the cost grows steeply towards the opening: balanced positions with 16
+stones take up to a minute and the empty board hours in pure Python. There
+is no book of solved openings (book.py stores depth-limited search
+results), so Game(engine='solver') only solves positions with at least
+MIN_STONES stones and plays the alpha-beta move before that. solve() takes
+an optional time or node budget and raises SearchTimeout when it runs out.
+"""
+import argparse
+import time
+
+from connectfourIM import (TranspositionTable, BOTTOM_MASK, BOARD_MASK, COLUMNS, MOVE_ORDER, WIDTH, HEIGHT, H1,
+                           WIN_SCORE, LOWER, UPPER, CHECK_NODES, SearchTimeout, has_won)
+from codec import xo_from_moves
+
+CELLS = WIDTH * HEIGHT
+# Fewest stones on the board for which Game(engine='solver') solves the
+# position. Positions from alpha-beta self-play solve in up to 20 seconds
+# with 18 stones, a minute with 16 and several minutes with 14.
+MIN_STONES = 18
+
+
+def winning_cells(bb, mask):
+    """Empty cells that would complete a line of `bb`."""
+    r = (bb << 1) & (bb << 2) & (bb << 3)
+    for shift in (H1, HEIGHT, H1 + 1):
+        p = (bb << shift) & (bb << 2 * shift)
+        r |= p & (bb << 3 * shift)
+        r |= p & (bb >> shift)
+        p = (bb >> shift) & (bb >> 2 * shift)
+        r |= p & (bb << shift)
+        r |= p & (bb >> 3 * shift)
+    return r & (BOARD_MASK ^ mask)
+
+
+def to_win_score(score, moves):
+    """Convert a compact score at a position with `moves` stones to the
+    WIN_SCORE - (stones before the winning move) convention."""
+    if score == 0:
+        return 0
+    k = CELLS // 2 + 1 - abs(score)
+    # The winner's k-th stone is stone 2k-1 of the game if they moved first
+    # and 2k otherwise; the side to move at the root moved first iff `moves`
+    # is even.
+    first = (moves % 2 == 0) == (score > 0)
+    before = 2 * k - 2 if first else 2 * k - 1
+    return WIN_SCORE - before if score > 0 else -(WIN_SCORE - before)
+
+
+def distance(score, moves):
+    """Plies from the position to the end of the game, for a WIN_SCORE value."""
+    if score == 0:
+        return CELLS - moves
+    return WIN_SCORE - abs(score) - moves + 1
+
+
+class Solver:
+    def __init__(self, table_size=1 << 22, table=None):
+        self.table = TranspositionTable(table_size) if table is None else table
+        self.nodes = 0
+        self.deadline = None
+        self.max_nodes = None
+        self.next_check = 0
+
+    def negamax(self, cur, mask, moves, alpha, beta):
+        # The side to move cannot win immediately: every caller has checked
+        # that, and moves that allow it are never expanded.
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.next_check = self.nodes + CHECK_NODES
+            if ((self.max_nodes is not None and self.nodes >= self.max_nodes)
+                    or (self.deadline is not None and time.perf_counter() >= self.deadline)):
+                raise SearchTimeout
+        legal = (mask + BOTTOM_MASK) & BOARD_MASK
+        threats = winning_cells(cur ^ mask, mask)
+        forced = legal & threats
+        if forced:
+            if forced & (forced - 1):
+                return -((CELLS - moves) // 2)
+            legal = forced
+        legal &= ~(threats >> 1)
+        if not legal:
+            return -((CELLS - moves) // 2)
+        if moves >= CELLS - 2:
+            return 0
+
+        low, high = -((CELLS - 2 - moves) // 2), (CELLS - 1 - moves) // 2
+        key = cur + mask
+        entry = self.table.probe(key)
+        hash_move = None
+        if entry is not None:
+            if entry[1] == UPPER:
+                high = min(high, entry[0])
+            else:
+                low = max(low, entry[0])
+            hash_move = entry[3]
+        if low >= beta:
+            return low
+        if high <= alpha:
+            return high
+        alpha, beta = max(alpha, low), min(beta, high)
+
+        # The column that refuted this position last time goes first, the
+        # rest by the number of winning cells they leave for the mover.
+        children = []
+        for col in MOVE_ORDER:
+            bit = legal & COLUMNS[col]
+            if bit:
+                count = WIDTH if col == hash_move else bin(winning_cells(cur | bit, mask | bit)).count('1')
+                children.append((count, -len(children), col, bit))
+        children.sort(reverse=True)
+        best, best_move = None, None
+        for _, _, col, bit in children:
+            score = -self.negamax(cur ^ mask, mask | bit, moves + 1, -beta, -alpha)
+            if score >= beta:
+                self.table.store(key, score, LOWER, 0, col)
+                return score
+            if best is None or score > best:
+                best, best_move = score, col
+            if score > alpha:
+                alpha = score
+        self.table.store(key, alpha, UPPER, 0, best_move)
+        return alpha
+
+    def value(self, cur, mask, moves):
+        """Exact compact score of a non-terminal position."""
+        legal = (mask + BOTTOM_MASK) & BOARD_MASK
+        if winning_cells(cur, mask) & legal:
+            return (CELLS + 1 - moves) // 2
+        low, high = -((CELLS - moves) // 2), (CELLS + 1 - moves) // 2
+        while low < high:
+            med = low + (high - low) // 2
+            if med <= 0 and int(low / 2) < med:
+                med = int(low / 2)
+            elif med >= 0 and int(high / 2) > med:
+                med = int(high / 2)
+            r = self.negamax(cur, mask, moves, med, med + 1)
+            if r <= med:
+                high = r
+            else:
+                low = r
+        return low
+
+    def solve(self, cur, mask, time_limit=None, node_limit=None):
+        """Return (best column, score) for the side owning `cur`, with the
+        score in the WIN_SCORE convention of connectfourIM. Raises
+        SearchTimeout if the time or node limit runs out first; the table
+        keeps what was proved so far."""
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.max_nodes = None if node_limit is None else self.nodes + node_limit
+        self.next_check = self.nodes
+        moves = bin(mask).count('1')
+        legal = (mask + BOTTOM_MASK) & BOARD_MASK
+        for col in MOVE_ORDER:
+            if legal & COLUMNS[col] and has_won(cur | (legal & COLUMNS[col])):
+                return col, WIN_SCORE - moves
+        score = self.value(cur, mask, moves)
+        # One more null-window search per column finds a move that keeps the
+        # value; the table is warm from the bisection, so this is cheap.
+        threats = winning_cells(cur ^ mask, mask)
+        safe = legal & threats or legal
+        safe &= ~(threats >> 1)
+        for col in MOVE_ORDER:
+            bit = safe & COLUMNS[col]
+            if bit and -self.negamax(cur ^ mask, mask | bit, moves + 1, -score, -score + 1) >= score:
+                return col, to_win_score(score, moves)
+        # Every move loses at once: play the forced block, or anything.
+        col = next(col for col in MOVE_ORDER if (legal & threats or legal) & COLUMNS[col])
+        return col, to_win_score(score, moves)
+
+def solve_moves(solver, text):
+    x, o = xo_from_moves(text)
+    return solver.solve(x if len(text) % 2 == 0 else o, x | o)
+
+
+def check(path, table_size):
+    failures, total, elapsed = 0, 0, 0.0
+    with open(path) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if not line:
+                continue
+            moves, expected = line.split()
+            solver = Solver(table_size)
+            start = time.perf_counter()
+            _, score = solve_moves(solver, moves)
+            seconds = time.perf_counter() - start
+            elapsed += seconds
+            total += 1
+            ok = score == int(expected)
+            failures += not ok
+            print(f"{moves or '-':<24} expected={expected:>5} got={score:>5} "
+                  f"nodes={solver.nodes:<9} {seconds:.3f}s{'' if ok else '  MISMATCH'}")
+    print(f"{total - failures}/{total} correct in {elapsed:.2f}s")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve Connect Four positions exactly")
+    parser.add_argument('positions', nargs='*', help="move strings of 0-based columns")
+    parser.add_argument('--check', help="file of '<moves> <score>' lines to verify")
+    parser.add_argument('--table-size', type=int, default=1 << 22)
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(1 if check(args.check, args.table_size) else 0)
+    solver = Solver(args.table_size)
+    for text in args.positions:
+        start = time.perf_counter()
+        move, score = solve_moves(solver, text)
+        moves = len(text)
+        result = 'draw' if score == 0 else ('win' if score > 0 else 'loss')
+        print(f"{text or '-'}: move={move} score={score} {result} in {distance(score, moves)} plies "
+              f"nodes={solver.nodes} {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,144 @@
+import argparse
+import json
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from connectfourIM import Game, BOTTOM_MASK, BOARD_MASK, COLUMNS, WIDTH, HEIGHT, has_won
+
+
+def new_game(config):
+    return Game([' ' * HEIGHT for _ in range(WIDTH)], 'X', options=set(range(WIDTH)), **config)
+
+
+def apply_move(game, col, turn):
+    game.turn = turn
+    game.make_move(col)
+
+
+def random_opening(rng, plies):
+    x = o = 0
+    opening = []
+    for ply in range(plies):
+        mask = x | o
+        legal = (mask + BOTTOM_MASK) & BOARD_MASK
+        own = x if ply % 2 == 0 else o
+        cols = [c for c in range(WIDTH) if legal & COLUMNS[c] and not has_won(own | (legal & COLUMNS[c]))]
+        col = rng.choice(cols)
+        if ply % 2 == 0:
+            x |= legal & COLUMNS[col]
+        else:
+            o |= legal & COLUMNS[col]
+        opening.append(col)
+    return opening
+
+
+def play_game(task):
+    """Play one game and return A's score (1, 0.5 or 0) with per-engine
+    totals of [moves, seconds, nodes]."""
+    config_a, config_b, opening, a_first = task
+    engines = {'X': new_game(config_a if a_first else config_b), '0': new_game(config_b if a_first else config_a)}
+    stats = {'X': [0, 0.0, 0], '0': [0, 0.0, 0]}
+    turn = 'X'
+    for col in opening:
+        for game in engines.values():
+            apply_move(game, col, turn)
+        turn = '0' if turn == 'X' else 'X'
+
+    winner = None
+    while True:
+        player = engines[turn]
+        player.turn = turn
+        nodes = player.nodes
+        start = time.perf_counter()
+        col = player.choose_move()
+        stats[turn][0] += 1
+        stats[turn][1] += time.perf_counter() - start
+        stats[turn][2] += player.nodes - nodes
+        for game in engines.values():
+            apply_move(game, col, turn)
+        if player.check_win():
+            winner = turn
+            break
+        if player.check_draw():
+            break
+        turn = '0' if turn == 'X' else 'X'
+
+    a, b = ('X', '0') if a_first else ('0', 'X')
+    score = 0.5 if winner is None else float(winner == a)
+    return score, stats[a], stats[b]
+
+
+def elo(scores):
+    """Elo difference with a 95% Wilson score interval on the mean score.
+    Draws count as half a win; the binomial variance is wider than the
+    trinomial one, and the interval stays wide for small or one-sided
+    samples instead of collapsing to a point."""
+    n = len(scores)
+    mean = sum(scores) / n
+    z = 1.96
+    center = (mean + z * z / (2 * n)) / (1 + z * z / n)
+    margin = z * math.sqrt(mean * (1 - mean) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+
+    def to_elo(p):
+        p = min(max(p, 1e-6), 1 - 1e-6)
+        return -400 * math.log10(1 / p - 1)
+
+    return to_elo(mean), to_elo(center - margin), to_elo(center + margin)
+
+
+def run(config_a, config_b, games, openings=None, plies=4, processes=None, seed=0):
+    if games < 1:
+        raise ValueError("a match needs at least one game")
+    rng = random.Random(seed)
+    tasks = []
+    # Every opening is played with both colour assignments, so an odd number
+    # of games is rounded up to whole pairs.
+    for i in range((games + 1) // 2):
+        opening = openings[i % len(openings)] if openings else random_opening(rng, plies)
+        tasks.append((config_a, config_b, opening, True))
+        tasks.append((config_a, config_b, opening, False))
+
+    totals = {'a': [0, 0.0, 0], 'b': [0, 0.0, 0]}
+    scores = []
+    with ProcessPoolExecutor(processes) as pool:
+        for score, a, b in pool.map(play_game, tasks, chunksize=max(1, len(tasks) // 64)):
+            scores.append(score)
+            for key, stats in (('a', a), ('b', b)):
+                totals[key] = [t + s for t, s in zip(totals[key], stats)]
+
+    rating, low, high = elo(scores)
+    report = {
+        'games': len(scores),
+        'wins': scores.count(1.0),
+        'draws': scores.count(0.5),
+        'losses': scores.count(0.0),
+        'elo': round(rating, 1),
+        'elo_95': [round(low, 1), round(high, 1)],
+    }
+    for key, (moves, seconds, nodes) in totals.items():
+        report[key] = {
+            'avg_move_ms': round(1000 * seconds / max(moves, 1), 3),
+            'nodes_per_sec': round(nodes / seconds) if seconds else 0,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Self-play match between two engine configurations")
+    parser.add_argument('--a', type=json.loads, default={}, help='Game keyword arguments as JSON, e.g. \'{"depth": 8}\'')
+    parser.add_argument('--b', type=json.loads, default={})
+    parser.add_argument('--games', type=int, default=100, help='rounded up to an even number: each opening is played twice')
+    parser.add_argument('--plies', type=int, default=4, help='random opening length')
+    parser.add_argument('--openings', help='file with one opening per line as column digits, e.g. 3324')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.games < 1:
+        parser.error("--games must be at least 1")
+    openings = None
+    if args.openings:
+        with open(args.openings) as f:
+            openings = [[int(c) for c in line.strip()] for line in f if line.strip()]
+    print(json.dumps(run(args.a, args.b, args.games, openings, args.plies, args.processes, args.seed), indent=2))